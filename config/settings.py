@@ -13,6 +13,7 @@ CSRF_TRUSTED_ORIGINS = [o.strip() for o in os.environ.get('CSRF_TRUSTED_ORIGINS'
 INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'crm',
 ]
 
@@ -68,3 +69,71 @@ SESSION_COOKIE_SAMESITE = 'Lax'
 CSRF_COOKIE_SAMESITE = 'Lax'
 
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+
+# Cache compartilhado entre os workers do gunicorn (em /dev/shm quando disponível).
+# Com vários containers, CRM_CACHE_DIR deve apontar para o mesmo volume em todos (docker-compose).
+# Guarda contadores de login (por e-mail e por IP), carimbos de versão e vínculos por usuário:
+# MAX_ENTRIES precisa comportar todos, senão o descarte aleatório zera contadores de tentativas.
+# Arquivos expirados são removidos pelo purge_sessions.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get(
+            'CRM_CACHE_DIR',
+            '/dev/shm/facilite-crm-cache' if os.path.isdir('/dev/shm') else str(BASE_DIR / '.cache'),
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('CRM_CACHE_MAX_ENTRIES', '20000')),
+        },
+    }
+}
+
+# Cache em memória das sessões resolvidas (segundos / número de entradas por worker).
+# Logout e desativação pelo CRM valem na hora em todos os workers; mudanças feitas direto
+# na tabela users levam até CRM_SESSION_CACHE_TTL segundos para valer.
+CRM_SESSION_CACHE_TTL = int(os.environ.get('CRM_SESSION_CACHE_TTL', '60'))
+CRM_SESSION_CACHE_SIZE = int(os.environ.get('CRM_SESSION_CACHE_SIZE', '2048'))
+
+# Tokens assinados da API (horas) e intervalo de recarga da lista de revogação (segundos)
+CRM_API_TOKEN_TTL_HOURS = int(os.environ.get('CRM_API_TOKEN_TTL_HOURS', '24'))
+CRM_API_TOKEN_MAX_TTL_HOURS = int(os.environ.get('CRM_API_TOKEN_MAX_TTL_HOURS', '720'))
+CRM_API_TOKEN_REVOCATION_TTL = int(os.environ.get('CRM_API_TOKEN_REVOCATION_TTL', '30'))
+# Ativo/admin do dono do token é conferido no banco, com cache por worker (segundos)
+CRM_API_USER_CACHE_TTL = int(os.environ.get('CRM_API_USER_CACHE_TTL', '30'))
+
+# Prefixos de caminho que nunca resolvem a sessão do cookie
+CRM_AUTH_SKIP_PATHS = [
+    p.strip() for p in os.environ.get('CRM_AUTH_SKIP_PATHS', '/static/,/media/,/api/health/,/login/').split(',') if p.strip()
+]
+
+# Login: pool de bcrypt, limite de fila, custo do hash e limite de tentativas por janela (segundos)
+CRM_BCRYPT_WORKERS = int(os.environ.get('CRM_BCRYPT_WORKERS', '2'))
+CRM_BCRYPT_QUEUE = int(os.environ.get('CRM_BCRYPT_QUEUE', '4'))
+CRM_BCRYPT_TIMEOUT = int(os.environ.get('CRM_BCRYPT_TIMEOUT', '5'))
+CRM_BCRYPT_ROUNDS = int(os.environ.get('CRM_BCRYPT_ROUNDS', '12'))
+CRM_LOGIN_MAX_ATTEMPTS_EMAIL = int(os.environ.get('CRM_LOGIN_MAX_ATTEMPTS_EMAIL', '8'))
+CRM_LOGIN_MAX_ATTEMPTS_IP = int(os.environ.get('CRM_LOGIN_MAX_ATTEMPTS_IP', '30'))
+CRM_LOGIN_WINDOW = int(os.environ.get('CRM_LOGIN_WINDOW', '900'))
+
+# Vínculos de equipe (team_id -> role) em cache, invalidados ao editar membros (segundos)
+CRM_PERMISSION_CACHE_TTL = int(os.environ.get('CRM_PERMISSION_CACHE_TTL', '60'))
+
+# Stream SSE de notificações: conexões simultâneas por worker, duração máxima e heartbeat (segundos).
+# Cada stream ocupa uma thread, então o padrão é 0 (responde 503 e o navegador usa polling).
+# Só o serviço facilite-crm-sse (docker-compose) liga os streams via env; para usá-lo, o proxy
+# precisa encaminhar /tasks/notifications/stream/ para ele.
+CRM_SSE_MAX_STREAMS = int(os.environ.get('CRM_SSE_MAX_STREAMS', '0'))
+# Streams consultando a contagem no banco ao mesmo tempo (por worker)
+CRM_SSE_DB_CONCURRENCY = int(os.environ.get('CRM_SSE_DB_CONCURRENCY', '4'))
+CRM_SSE_MAX_SECONDS = int(os.environ.get('CRM_SSE_MAX_SECONDS', '300'))
+CRM_SSE_HEARTBEAT = int(os.environ.get('CRM_SSE_HEARTBEAT', '20'))
+
+# Retenção de notificações (dias): depois disso vão para o arquivo; o arquivo é apagado após CRM_NOTIFICATION_ARCHIVE_DAYS (0 = nunca)
+CRM_NOTIFICATION_RETENTION_DAYS = int(os.environ.get('CRM_NOTIFICATION_RETENTION_DAYS', '90'))
+CRM_NOTIFICATION_ARCHIVE_DAYS = int(os.environ.get('CRM_NOTIFICATION_ARCHIVE_DAYS', '730'))
+
+# Automações de estágio via outbox + run_automation_worker (false = executa na própria requisição)
+CRM_AUTOMATIONS_ASYNC = os.environ.get('CRM_AUTOMATIONS_ASYNC', 'true').lower() == 'true'
+
+# Agendador de recorrências: execuções perdidas repostas por regra após o agendador ficar parado
+CRM_RECURRENCE_MAX_BACKFILL = int(os.environ.get('CRM_RECURRENCE_MAX_BACKFILL', '7'))
@@ -1,4 +1,5 @@
 import json
+import os
 import uuid
 
 from django.http import JsonResponse
@@ -6,8 +7,12 @@ from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_GET, require_http_methods
 
-from .auth import get_session
-from .models import Client, ClientContact, ClientCredentialSimple, ClientLink
+from .auth import get_session, session_cache_stats
+from .tokens import is_api_token, issue_api_token, revoke_api_token, signing_enabled, verify_api_token
+from .models import Client, ClientContact, ClientCredentialSimple, ClientLink, TaskDemand
+from .notifications import notification_cursor, page_notifications, unread_count, visible_notifications
+from .permissions import get_permissions
+from .search import clients_in_order, refresh_client_search, refresh_client_tasks_search, search_clients
 
 
 def _resolve_user_ctx(request):
@@ -21,7 +26,7 @@ def _resolve_user_ctx(request):
     if not token:
         token = request.COOKIES.get('crm_session')
 
-    ctx = get_session(token)
+    ctx = verify_api_token(token) if is_api_token(token) else get_session(token)
     if ctx:
         request.user_ctx = ctx
     return ctx
@@ -70,6 +75,15 @@ def api_health(request):
     return JsonResponse({'ok': True, 'service': 'facilite-crm-django'})
 
 
+@require_GET
+def api_cache_stats(request):
+    """Acertos/erros do cache de sessões deste worker (cada worker tem o seu; veja o pid)."""
+    guard = _admin_required(request)
+    if guard:
+        return guard
+    return JsonResponse({'pid': os.getpid(), 'sessions': session_cache_stats()})
+
+
 @require_GET
 def api_me(request):
     guard = _auth_required(request)
@@ -85,6 +99,54 @@ def api_me(request):
     })
 
 
+@csrf_exempt
+@require_http_methods(['POST'])
+def api_tokens(request):
+    guard = _auth_required(request)
+    if guard:
+        return guard
+
+    # Tokens assinados só podem ser emitidos a partir de uma sessão real,
+    # para que um token não consiga se renovar indefinidamente.
+    if not request.user_ctx.get('session'):
+        return JsonResponse({'detail': 'Use um token de sessão para emitir tokens de API'}, status=403)
+
+    if not signing_enabled():
+        return JsonResponse({'detail': 'Tokens de API indisponíveis: SECRET_KEY não configurada'}, status=503)
+
+    data = _json_body(request)
+    if data is None:
+        return JsonResponse({'detail': 'JSON inválido'}, status=400)
+
+    ttl_hours = _as_int(data.get('ttl_hours'), default=0, minimum=0, maximum=100000) or None
+    token, expires_at, jti = issue_api_token(request.user_ctx['user'], ttl_hours=ttl_hours)
+    return JsonResponse({'token': token, 'token_type': 'Bearer', 'jti': jti, 'expires_at': expires_at}, status=201)
+
+
+@csrf_exempt
+@require_http_methods(['POST'])
+def api_token_revoke(request):
+    guard = _auth_required(request)
+    if guard:
+        return guard
+
+    data = _json_body(request)
+    if data is None:
+        return JsonResponse({'detail': 'JSON inválido'}, status=400)
+
+    token = (data.get('token') or '').strip()
+    token_ctx = verify_api_token(token)
+    if not token_ctx:
+        return JsonResponse({'detail': 'Token inválido ou expirado'}, status=400)
+
+    user = request.user_ctx['user']
+    if str(token_ctx['user'].id) != str(user.id) and not user.is_admin:
+        return JsonResponse({'detail': 'Acesso negado'}, status=403)
+
+    revoke_api_token(token)
+    return JsonResponse({'detail': 'Token revogado com sucesso'})
+
+
 @csrf_exempt
 @require_http_methods(['GET', 'POST'])
 def api_clients(request):
@@ -97,14 +159,16 @@ def api_clients(request):
         limit = _as_int(request.GET.get('limit'), default=50, minimum=1, maximum=200)
         offset = _as_int(request.GET.get('offset'), default=0, minimum=0, maximum=100000)
 
-        qs = Client.objects.all().order_by('name', 'id')
+        fields = ('id', 'org_id', 'name', 'cnpj', 'status', 'type', 'notes', 'updated_at', 'created_at')
         if q:
-            qs = qs.filter(name__icontains=q)
-
-        total = qs.count()
-        items = list(qs[offset:offset + limit].values(
-            'id', 'org_id', 'name', 'cnpj', 'status', 'type', 'notes', 'updated_at', 'created_at'
-        ))
+            ranked = search_clients(q)
+            total = ranked.count()
+            ids = list(ranked.values_list('client_id', flat=True)[offset:offset + limit])
+            items = [{f: getattr(c, f) for f in fields} for c in clients_in_order(ids)]
+        else:
+            qs = Client.objects.all().order_by('name', 'id')
+            total = qs.count()
+            items = list(qs[offset:offset + limit].values(*fields))
 
         return JsonResponse({'count': total, 'limit': limit, 'offset': offset, 'results': items})
 
@@ -128,6 +192,7 @@ def api_clients(request):
         updated_at=now,
         created_at=now,
     )
+    refresh_client_search([client.id])
 
     return JsonResponse({'id': client.id, 'detail': 'Cliente criado com sucesso'}, status=201)
 
@@ -177,6 +242,10 @@ def api_client_detail(request, client_id):
         client_obj.updated_at = timezone.now()
         changed.append('updated_at')
         client_obj.save(update_fields=changed)
+        if 'name' in changed or 'cnpj' in changed:
+            refresh_client_search([client_id])
+        if 'name' in changed:
+            refresh_client_tasks_search(client_id)
         return JsonResponse({'detail': 'Cliente atualizado com sucesso'})
 
     admin_guard = _admin_required(request)
@@ -187,9 +256,82 @@ def api_client_detail(request, client_id):
     ClientCredentialSimple.objects.filter(client_id=client_id).delete()
     ClientLink.objects.filter(client_id=client_id).delete()
     client_obj.delete()
+    refresh_client_search([client_id])
     return JsonResponse({'detail': 'Cliente removido com sucesso'})
 
 
+# -------- Tasks --------
+@require_GET
+def api_my_tasks(request):
+    guard = _auth_required(request)
+    if guard:
+        return guard
+
+    limit = _as_int(request.GET.get('limit'), default=50, minimum=1, maximum=200)
+    offset = _as_int(request.GET.get('offset'), default=0, minimum=0, maximum=100000)
+
+    user = request.user_ctx['user']
+    qs = TaskDemand.objects.filter(assignees__user_id=user.id).order_by('-updated_at', '-id')
+    allowed_team_ids = get_permissions(request).allowed_team_ids()
+    if allowed_team_ids is not None:
+        qs = qs.filter(team_id__in=allowed_team_ids)
+
+    total = qs.count()
+    items = list(qs[offset:offset + limit].values(
+        'id', 'title', 'client_id', 'stage_id', 'stage__name', 'workspace_id', 'team_id',
+        'assigned_to', 'due_date', 'priority', 'position', 'updated_at', 'created_at'
+    ))
+    return JsonResponse({'count': total, 'limit': limit, 'offset': offset, 'results': items})
+
+
+@require_GET
+def api_notifications(request):
+    guard = _auth_required(request)
+    if guard:
+        return guard
+
+    user = request.user_ctx['user']
+    limit = _as_int(request.GET.get('limit'), default=20, minimum=1, maximum=100)
+    before = (request.GET.get('before') or '').strip() or None
+    after = (request.GET.get('after') or '').strip() or None
+    if before and after:
+        return JsonResponse({'detail': 'Use apenas um de "before" ou "after"'}, status=400)
+
+    try:
+        items, newer, older = page_notifications(
+            visible_notifications(get_permissions(request).allowed_team_ids()).only(
+                'id', 'task_id', 'team_id', 'event_type', 'message', 'created_at'
+            ),
+            user.id,
+            before=before,
+            after=after,
+            unread_only=request.GET.get('unread') in ('1', 'true'),
+            limit=limit,
+        )
+    except ValueError:
+        return JsonResponse({'detail': 'Cursor inválido'}, status=400)
+
+    return JsonResponse({
+        'unread_count': unread_count(user.id),
+        'limit': limit,
+        'newer_cursor': newer,
+        'older_cursor': older,
+        'results': [
+            {
+                'id': n.id,
+                'task_id': n.task_id,
+                'team_id': n.team_id,
+                'event_type': n.event_type,
+                'message': n.message,
+                'created_at': n.created_at,
+                'unread': n.unread,
+                'cursor': notification_cursor(n),
+            }
+            for n in items
+        ],
+    })
+
+
 # -------- Contacts --------
 @csrf_exempt
 @require_http_methods(['GET', 'POST'])
@@ -227,6 +369,7 @@ def api_client_contacts(request, client_id):
         notes=data.get('notes'),
         created_at=timezone.now(),
     )
+    refresh_client_search([client_id])
     return JsonResponse({'id': contact.id, 'detail': 'Contato criado com sucesso'}, status=201)
 
 
@@ -266,6 +409,8 @@ def api_contact_detail(request, contact_id):
             return JsonResponse({'detail': 'Nada para atualizar'})
 
         obj.save(update_fields=changed)
+        if 'email' in changed or 'phone' in changed:
+            refresh_client_search([obj.client_id])
         return JsonResponse({'detail': 'Contato atualizado com sucesso'})
 
     admin_guard = _admin_required(request)
@@ -273,6 +418,7 @@ def api_contact_detail(request, contact_id):
         return admin_guard
 
     obj.delete()
+    refresh_client_search([obj.client_id])
     return JsonResponse({'detail': 'Contato removido com sucesso'})
 
 
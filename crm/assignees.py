@@ -0,0 +1,95 @@
+import hashlib
+
+from django.core.cache import cache
+from django.db import models
+from django.utils import timezone
+
+from .models import TaskAssignee, TaskDemand, User
+
+
+def assignable_users():
+    # Inclui inativos: ao reativar, o usuário volta a ter acesso às tarefas em que é citado.
+    return list(User.objects.only('id', 'email', 'name'))
+
+
+def match_assignees(assigned_to, users):
+    """IDs dos usuários citados no texto livre de `assigned_to` (e-mail ou nome completo)."""
+    text = (assigned_to or '').lower()
+    if not text.strip():
+        return []
+    matched = []
+    for u in users:
+        email = (u.email or '').strip().lower()
+        name = (u.name or '').strip().lower()
+        if (email and email in text) or (name and name in text):
+            matched.append(u.id)
+    return matched
+
+
+def set_task_assignees(task, user_ids):
+    TaskAssignee.objects.filter(task=task).exclude(user_id__in=user_ids).delete()
+    now = timezone.now()
+    TaskAssignee.objects.bulk_create(
+        [TaskAssignee(task=task, user_id=uid, created_at=now) for uid in user_ids],
+        ignore_conflicts=True,
+    )
+
+
+def sync_task_assignees(task, users=None):
+    users = assignable_users() if users is None else users
+    set_task_assignees(task, match_assignees(task.assigned_to, users))
+
+
+def copy_assignees_many(new_tasks_by_source):
+    """Copia os responsáveis de cada tarefa de origem para as novas tarefas (uma consulta + um INSERT)."""
+    by_source = {}
+    for source_id, user_id in TaskAssignee.objects.filter(task_id__in=list(new_tasks_by_source)).values_list('task_id', 'user_id'):
+        by_source.setdefault(source_id, []).append(user_id)
+    now = timezone.now()
+    TaskAssignee.objects.bulk_create(
+        [
+            TaskAssignee(task=t, user_id=uid, created_at=now)
+            for source_id, tasks in new_tasks_by_source.items()
+            for t in tasks
+            for uid in by_source.get(source_id, ())
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def _identity_key(user):
+    identity = f"{(user.email or '').strip().lower()}\n{(user.name or '').strip().lower()}"
+    return f'crm:assignee-identity:{user.id}', hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+
+def resync_user_assignees(user):
+    """Refaz os vínculos do usuário com as tarefas que citam o e-mail/nome atual dele."""
+    email = (user.email or '').strip()
+    name = (user.name or '').strip()
+    cond = models.Q(pk__in=[])
+    if email:
+        cond |= models.Q(assigned_to__icontains=email)
+    if name:
+        cond |= models.Q(assigned_to__icontains=name)
+    task_ids = [
+        task_id
+        for task_id, assigned_to in TaskDemand.objects.filter(cond).values_list('id', 'assigned_to')
+        if match_assignees(assigned_to, [user])
+    ]
+    TaskAssignee.objects.filter(user_id=user.id).exclude(task_id__in=task_ids).delete()
+    now = timezone.now()
+    TaskAssignee.objects.bulk_create(
+        [TaskAssignee(task_id=task_id, user_id=user.id, created_at=now) for task_id in task_ids],
+        ignore_conflicts=True,
+    )
+    return len(task_ids)
+
+
+def ensure_user_assignees(user):
+    """Chamado ao resolver o usuário de uma sessão/token: usuário novo ou com nome/e-mail
+    alterado (a tabela users é mantida fora do CRM) tem os vínculos recalculados."""
+    key, identity = _identity_key(user)
+    if cache.get(key) == identity:
+        return
+    resync_user_assignees(user)
+    cache.set(key, identity, None)
@@ -1,24 +1,137 @@
+import hashlib
 import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import timedelta
 
 import bcrypt
+from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 
+from .assignees import ensure_user_assignees
+from .cache import TTLCache, bump_version, get_version, shared_lock
 from .models import User, Session
 
 
-def authenticate(email: str, password: str):
+# Contextos {session, user} já resolvidos, indexados pelo hash do token. Cada entrada guarda
+# o carimbo do usuário: logout/desativação trocam o carimbo e todos os workers descartam.
+# Mudanças feitas direto na tabela users (fora do CRM) só são vistas após CRM_SESSION_CACHE_TTL.
+_session_cache = TTLCache(
+    maxsize=getattr(settings, 'CRM_SESSION_CACHE_SIZE', 2048),
+    ttl=getattr(settings, 'CRM_SESSION_CACHE_TTL', 60),
+)
+
+
+def _token_key(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def user_stamp(user_id):
+    return get_version(f'user:{user_id}')
+
+
+class LoginThrottled(Exception):
+    """Too many failed attempts for this IP or e-mail inside the window."""
+
+
+class LoginBusy(Exception):
+    """The bcrypt pool is saturated; the caller should retry later."""
+
+
+# bcrypt libera o GIL, então um pool pequeno limita a CPU gasta com hashing
+# sem ocupar todas as threads do gunicorn durante uma rajada de logins.
+_hash_workers = max(int(getattr(settings, 'CRM_BCRYPT_WORKERS', 2)), 1)
+_hash_executor = ThreadPoolExecutor(max_workers=_hash_workers, thread_name_prefix='crm-bcrypt')
+_hash_slots = threading.BoundedSemaphore(_hash_workers + max(int(getattr(settings, 'CRM_BCRYPT_QUEUE', 4)), 0))
+
+
+def _run_hash(fn, *args):
+    if not _hash_slots.acquire(blocking=False):
+        raise LoginBusy()
+    try:
+        fut = _hash_executor.submit(fn, *args)
+    except Exception:
+        _hash_slots.release()
+        raise
+    fut.add_done_callback(lambda _f: _hash_slots.release())
+    try:
+        return fut.result(timeout=getattr(settings, 'CRM_BCRYPT_TIMEOUT', 5))
+    except FutureTimeoutError:
+        raise LoginBusy()
+
+
+def _hash_cost(password_hash):
+    try:
+        return int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def _throttle_keys(email, ip):
+    keys = ['crm:login:email:' + hashlib.sha256(email.encode('utf-8')).hexdigest()]
+    if ip:
+        keys.append('crm:login:ip:' + ip)
+    return keys
+
+
+def _throttle_limits():
+    return (
+        getattr(settings, 'CRM_LOGIN_MAX_ATTEMPTS_EMAIL', 8),
+        getattr(settings, 'CRM_LOGIN_MAX_ATTEMPTS_IP', 30),
+    )
+
+
+def _check_throttle(email, ip):
+    keys = _throttle_keys(email, ip)
+    counts = cache.get_many(keys)
+    for key, limit in zip(keys, _throttle_limits()):
+        if counts.get(key, 0) >= limit:
+            raise LoginThrottled()
+
+
+def _register_failure(email, ip):
+    window = getattr(settings, 'CRM_LOGIN_WINDOW', 900)
+    with shared_lock('login-throttle'):
+        for key in _throttle_keys(email, ip):
+            if not cache.add(key, 1, window):
+                try:
+                    cache.incr(key)
+                except ValueError:
+                    cache.set(key, 1, window)
+
+
+def _maybe_rehash(user, password):
+    rounds = getattr(settings, 'CRM_BCRYPT_ROUNDS', 12)
+    if _hash_cost(user.password_hash) == rounds:
+        return
+    try:
+        new_hash = _run_hash(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(rounds))
+    except LoginBusy:
+        return  # tenta de novo no próximo login
+    user.password_hash = new_hash.decode('utf-8')
+    User.objects.filter(id=user.id).update(password_hash=user.password_hash)
+
+
+def authenticate(email: str, password: str, ip=None):
+    """Returns the User or None. Raises LoginThrottled / LoginBusy under load."""
     email = (email or '').strip().lower()
     if not email or not password:
         return None
+    _check_throttle(email, ip)
     try:
         u = User.objects.get(email=email)
     except User.DoesNotExist:
+        _register_failure(email, ip)
         return None
     if not u.active:
         return None
-    if not bcrypt.checkpw(password.encode('utf-8'), u.password_hash.encode('utf-8')):
+    if not _run_hash(bcrypt.checkpw, password.encode('utf-8'), u.password_hash.encode('utf-8')):
+        _register_failure(email, ip)
         return None
+    cache.delete(_throttle_keys(email, ip)[0])
+    _maybe_rehash(u, password)
     return u
 
 
@@ -34,33 +147,76 @@ def create_session(user_id, days=14):
 def get_session(token: str):
     if not token:
         return None
-    s = Session.objects.filter(token=token).first()
+    key = _token_key(token)
+    now = timezone.now()
+    ctx = _session_cache.get(key)
+    if ctx is not None:
+        if ctx['session'].expires_at <= now:
+            _session_cache.delete(key)
+            return None
+        if ctx['stamp'] == user_stamp(ctx['user'].id):
+            return {'session': ctx['session'], 'user': ctx['user']}
+        _session_cache.delete(key)
+
+    s = Session.objects.filter(token=token, expires_at__gt=now).first()
     if not s:
         return None
-    if s.expires_at <= timezone.now():
-        return None
+    # Lido antes do usuário: uma desativação concorrente deixa a entrada com carimbo antigo.
+    stamp = user_stamp(s.user_id)
     try:
         u = User.objects.get(id=s.user_id)
     except User.DoesNotExist:
         return None
     if not u.active:
         return None
+    ensure_user_assignees(u)
+    _session_cache.set(key, {'session': s, 'user': u, 'stamp': stamp}, ttl=(s.expires_at - now).total_seconds())
     return {'session': s, 'user': u}
 
 
 def destroy_session(token: str):
     if not token:
         return
+    _session_cache.delete(_token_key(token))
+    user_id = Session.objects.filter(token=token).values_list('user_id', flat=True).first()
     Session.objects.filter(token=token).delete()
+    if user_id:
+        invalidate_user_sessions(user_id)
+
+
+def destroy_user_sessions(user_id):
+    """Logs the user out everywhere (uses the sessions.user_id index)."""
+    deleted, _ = Session.objects.filter(user_id=user_id).delete()
+    invalidate_user_sessions(user_id)
+    return deleted
+
+
+def invalidate_user_sessions(user_id):
+    """Descarta as sessões do usuário em cache em todos os workers (logout, desativação, troca de senha)."""
+    bump_version(f'user:{user_id}')
+    user_id = str(user_id)
+    return _session_cache.delete_where(lambda ctx: str(ctx['user'].id) == user_id)
+
+
+def session_cache_stats():
+    return _session_cache.stats()
 
 
 class SessionAuthMiddleware:
-    """Attaches request.user_ctx = {user, session} when crm_session cookie is valid."""
+    """Attaches request.user_ctx = {user, session} when crm_session cookie is valid.
+
+    The session is only resolved the first time a view reads request.user_ctx;
+    paths in CRM_AUTH_SKIP_PATHS never touch the session tables.
+    """
 
     def __init__(self, get_response):
         self.get_response = get_response
+        self.skip_paths = tuple(getattr(settings, 'CRM_AUTH_SKIP_PATHS', ()))
 
     def __call__(self, request):
         token = request.COOKIES.get('crm_session')
-        request.user_ctx = get_session(token)
+        if not token or (self.skip_paths and request.path_info.startswith(self.skip_paths)):
+            request.user_ctx = None
+        else:
+            request.user_ctx = SimpleLazyObject(lambda: get_session(token))
         return self.get_response(request)
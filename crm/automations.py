@@ -0,0 +1,182 @@
+import re
+import threading
+import time
+from datetime import timedelta
+from itertools import product
+
+from django.db import DatabaseError, models, transaction
+from django.utils import timezone
+
+from .cache import bump_version, get_version
+from .models import AutomationOutbox, TaskAutomation, TaskComment
+
+VERSION_NAME = 'automations'
+# Além do carimbo, o índice é remontado periodicamente (mudanças feitas fora das telas).
+MAX_AGE = 300
+
+_PLACEHOLDER = re.compile(r'\{\{(task_title|from_stage|to_stage)\}\}')
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+_index_built_at = 0.0
+
+
+class CompiledRule:
+    __slots__ = ('id', 'name', 'action', 'order', 'prefix', 'parts')
+
+    def __init__(self, automation, order):
+        self.id = automation.id
+        self.name = automation.name
+        self.action = automation.action
+        self.order = order
+        self.prefix = '[AUTO]' if automation.action == 'comment' else '[AUTO-NOTIFY]'
+        template = (automation.message_template or '').strip()
+        if not template:
+            template = f"Automação '{automation.name}' executada na mudança de estágio."
+        # Pré-processa o template em pedaços literais e campos: ('', texto) ou (campo, None).
+        self.parts = []
+        pos = 0
+        for m in _PLACEHOLDER.finditer(template):
+            if m.start() > pos:
+                self.parts.append(('', template[pos:m.start()]))
+            self.parts.append((m.group(1), None))
+            pos = m.end()
+        if pos < len(template):
+            self.parts.append(('', template[pos:]))
+
+    def render(self, task, old_stage_id, new_stage_id):
+        values = {
+            'task_title': task.title or '',
+            'from_stage': str(old_stage_id or ''),
+            'to_stage': str(new_stage_id or ''),
+        }
+        msg = ''.join(text if not field else values[field] for field, text in self.parts)
+        return f'{self.prefix} {msg}'
+
+
+class AutomationIndex:
+    """Regras ativas indexadas por (workspace, equipe, estágio de origem, estágio de destino); None = qualquer."""
+
+    def __init__(self, automations):
+        self.rules = {}
+        self.workspace_keys = set()
+        self.team_keys = set()
+        for order, a in enumerate(automations):
+            key = (a.workspace_id, a.team_id, a.trigger_from_stage_id, a.trigger_to_stage_id)
+            self.rules.setdefault(key, []).append(CompiledRule(a, order))
+            self.workspace_keys.add(a.workspace_id)
+            self.team_keys.add(a.team_id)
+
+    def match(self, task, old_stage_id, new_stage_id):
+        if not self.rules:
+            return []
+        # Tarefa sem workspace/equipe casa com regras de qualquer workspace/equipe (regra original).
+        ws_keys = (task.workspace_id, None) if task.workspace_id else self.workspace_keys
+        team_keys = (task.team_id, None) if task.team_id else self.team_keys
+        found = []
+        for key in product(ws_keys, team_keys, {old_stage_id, None}, {new_stage_id, None}):
+            found.extend(self.rules.get(key, ()))
+        found.sort(key=lambda r: r.order)
+        return found
+
+
+def get_index():
+    global _index, _index_version, _index_built_at
+    version = get_version(VERSION_NAME)
+    if _index is not None and _index_version == version and time.monotonic() - _index_built_at < MAX_AGE:
+        return _index
+    with _lock:
+        if _index is None or _index_version != version or time.monotonic() - _index_built_at >= MAX_AGE:
+            automations = TaskAutomation.objects.filter(active=True).order_by('-created_at', '-id').only(
+                'id', 'name', 'action', 'message_template', 'workspace_id', 'team_id',
+                'trigger_from_stage_id', 'trigger_to_stage_id', 'created_at',
+            )
+            _index = AutomationIndex(list(automations))
+            _index_version = version
+            _index_built_at = time.monotonic()
+        return _index
+
+
+def matching_rules(task, old_stage_id, new_stage_id):
+    return get_index().match(task, old_stage_id, new_stage_id)
+
+
+def invalidate():
+    bump_version(VERSION_NAME)
+
+
+# ===== Outbox (execução assíncrona, ver run_automation_worker) =====
+def process_outbox_batch(batch_size=50, max_attempts=5, backoff_base=5):
+    """Executa um lote do outbox; vários workers podem rodar em paralelo (SKIP LOCKED).
+
+    Retorna a lista de (automation_id, latência em segundos, ok) dos itens tratados.
+    """
+    now = timezone.now()
+    results = []
+    with transaction.atomic():
+        items = list(
+            AutomationOutbox.objects.select_for_update(skip_locked=True, of=('self',))
+            .select_related('task')
+            .filter(status='pending', available_at__lte=now)
+            .order_by('available_at', 'id')[:batch_size]
+        )
+        if not items:
+            return results
+
+        try:
+            # Savepoint: se a gravação do lote falhar, os itens (ainda travados) voltam à fila com backoff.
+            with transaction.atomic():
+                results = _execute(items, now, max_attempts, backoff_base)
+        except DatabaseError as exc:
+            results = []
+            for item in items:
+                _reschedule(item, exc, now, max_attempts, backoff_base)
+                results.append((item.automation_id, (now - item.created_at).total_seconds(), False))
+    return results
+
+
+def _execute(items, now, max_attempts, backoff_base):
+    rules = {
+        a.id: CompiledRule(a, 0)
+        for a in TaskAutomation.objects.filter(id__in={i.automation_id for i in items if i.automation_id}, active=True)
+    }
+    results = []
+    comments, done, failed = [], [], []
+    for item in items:
+        try:
+            rule = rules.get(item.automation_id)
+            # Automação removida ou desativada depois do enfileiramento: nada a executar.
+            if rule is not None:
+                comments.append(TaskComment(
+                    task_id=item.task_id,
+                    comment=rule.render(item.task, item.old_stage_id, item.new_stage_id),
+                    author=item.actor or 'automation',
+                    created_at=now,
+                ))
+            done.append(item)
+        except Exception as exc:
+            failed.append((item, exc))
+
+    TaskComment.objects.bulk_create(comments)
+    AutomationOutbox.objects.filter(id__in=[i.id for i in done]).update(
+        status='done', processed_at=now, attempts=models.F('attempts') + 1,
+    )
+    for item in done:
+        results.append((item.automation_id, (now - item.created_at).total_seconds(), True))
+    for item, exc in failed:
+        _reschedule(item, exc, now, max_attempts, backoff_base)
+        results.append((item.automation_id, (now - item.created_at).total_seconds(), False))
+    return results
+
+
+def _reschedule(item, exc, now, max_attempts, backoff_base):
+    item.attempts += 1
+    item.last_error = f'{type(exc).__name__}: {exc}'[:2000]
+    if item.attempts >= max_attempts:
+        item.status = 'failed'
+        item.processed_at = now
+    else:
+        # Backoff exponencial: base, 2*base, 4*base... limitado a 1h.
+        item.available_at = now + timedelta(seconds=min(backoff_base * 2 ** (item.attempts - 1), 3600))
+    item.save(update_fields=['attempts', 'last_error', 'status', 'processed_at', 'available_at'])
@@ -0,0 +1,139 @@
+import fcntl
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+
+
+class TTLCache:
+    """Cache em memória (por processo) com expiração por item e descarte LRU.
+
+    Thread-safe: o gunicorn roda com várias threads por worker.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = max(int(maxsize), 1)
+        self.ttl = float(ttl)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            expires, value = item
+            if expires <= now:
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else min(float(ttl), self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate):
+        with self._lock:
+            keys = [k for k, (_, v) in self._data.items() if predicate(v)]
+            for k in keys:
+                del self._data[k]
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+# ===== Carimbos de versão (invalidação entre workers) =====
+# Cada worker guarda seus índices em memória junto com o carimbo usado para montá-los;
+# quem altera os dados troca o carimbo no cache compartilhado e todos remontam.
+def _version_key(name):
+    return f'crm:version:{name}'
+
+
+def get_version(name):
+    key = _version_key(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name):
+    cache.set(_version_key(name), uuid.uuid4().hex, None)
+
+
+# ===== Cache compartilhado em arquivos =====
+@contextmanager
+def _file_lock(directory, name):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'.{name}.lock')
+    with open(path, 'a') as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def shared_lock(name):
+    """Trava entre processos do mesmo host para leitura+escrita no cache em arquivos.
+
+    O incr do FileBasedCache é get + set: sem a trava, incrementos simultâneos de
+    workers diferentes se perdem. Em outros backends o incr já é atômico.
+    """
+    backend = caches['default']
+    if isinstance(backend, FileBasedCache):
+        return _file_lock(backend._dir, name)
+    return nullcontext()
+
+
+def prune_expired():
+    """Remove do cache em arquivos as entradas expiradas (o backend só as apaga ao ler)."""
+    backend = caches['default']
+    if not isinstance(backend, FileBasedCache):
+        return 0
+    removed = 0
+    for fname in backend._list_cache_files():
+        try:
+            with open(fname, 'rb') as f:
+                removed += backend._is_expired(f)
+        except FileNotFoundError:
+            continue
+    return removed
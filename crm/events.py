@@ -0,0 +1,143 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+# Pub/sub em processo para eventos leves (ex.: contagem de notificações).
+# No Postgres a publicação passa por NOTIFY e cada worker do gunicorn mantém
+# uma conexão LISTEN que repassa os eventos aos assinantes locais.
+CHANNEL = 'crm_events'
+
+logger = logging.getLogger(__name__)
+
+_subscribers = set()
+_lock = threading.Lock()
+_listener = None
+_stream_slots = None
+_db_slots = None
+
+
+class Subscription:
+    def __init__(self, maxlen=100):
+        self._events = deque(maxlen=maxlen)
+        self._cond = threading.Condition()
+
+    def put(self, payload):
+        with self._cond:
+            self._events.append(payload)
+            self._cond.notify()
+
+    def wait(self, timeout):
+        """Bloqueia até `timeout` segundos e devolve os eventos pendentes (lista possivelmente vazia)."""
+        with self._cond:
+            if not self._events:
+                self._cond.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+        return events
+
+
+def _dispatch(payload):
+    with _lock:
+        subs = list(_subscribers)
+    for sub in subs:
+        sub.put(payload)
+
+
+def publish(kind, team_ids=None, user_ids=None):
+    """Publica um evento para todos os workers.
+
+    `team_ids`/`user_ids` restringem quem se interessa; None em ambos significa "todos".
+    """
+    payload = {
+        'kind': kind,
+        'team_ids': None if team_ids is None else list(team_ids),
+        'user_ids': None if user_ids is None else list(user_ids),
+    }
+    if connection.vendor == 'postgresql':
+        # pg_notify respeita a transação: só é entregue após o commit.
+        with connection.cursor() as cur:
+            cur.execute('SELECT pg_notify(%s, %s)', [CHANNEL, json.dumps(payload)])
+    else:
+        transaction.on_commit(lambda: _dispatch(payload))
+
+
+def subscribe():
+    sub = Subscription()
+    with _lock:
+        _subscribers.add(sub)
+    _ensure_listener()
+    return sub
+
+
+def unsubscribe(sub):
+    with _lock:
+        _subscribers.discard(sub)
+
+
+def _ensure_listener():
+    global _listener
+    if connections['default'].vendor != 'postgresql':
+        return
+    with _lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = threading.Thread(target=_listen_forever, name='crm-events-listener', daemon=True)
+            _listener.start()
+
+
+def _listen_forever():
+    import psycopg
+
+    backoff = 1
+    while True:
+        try:
+            params = connections['default'].get_connection_params()
+            with psycopg.connect(**params, autocommit=True) as conn:
+                conn.execute(f'LISTEN {CHANNEL}')
+                backoff = 1
+                # Eventos podem ter sido perdidos enquanto não havia LISTEN: assinantes recalculam.
+                _dispatch({'kind': 'resync', 'team_ids': None})
+                while True:
+                    for n in conn.notifies(timeout=30):
+                        try:
+                            _dispatch(json.loads(n.payload))
+                        except ValueError:
+                            continue
+        except Exception:
+            logger.exception('Listener de eventos caiu; reconectando em %ss', backoff)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+
+
+def acquire_stream_slot():
+    """Limita as conexões de streaming abertas por worker (cada uma ocupa uma thread).
+
+    Com CRM_SSE_MAX_STREAMS=0 nenhum stream é aceito e o navegador fica no polling.
+    """
+    global _stream_slots
+    limit = getattr(settings, 'CRM_SSE_MAX_STREAMS', 0)
+    if limit <= 0:
+        return False
+    if _stream_slots is None:
+        with _lock:
+            if _stream_slots is None:
+                _stream_slots = threading.BoundedSemaphore(limit)
+    return _stream_slots.acquire(blocking=False)
+
+
+def release_stream_slot():
+    _stream_slots.release()
+
+
+def db_slot():
+    """Limita quantos streams consultam o banco ao mesmo tempo (um evento para todos acorda todos)."""
+    global _db_slots
+    if _db_slots is None:
+        with _lock:
+            if _db_slots is None:
+                _db_slots = threading.BoundedSemaphore(max(getattr(settings, 'CRM_SSE_DB_CONCURRENCY', 4), 1))
+    return _db_slots
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from crm.assignees import assignable_users, match_assignees
+from crm.models import TaskAssignee, TaskDemand
+
+
+class Command(BaseCommand):
+    help = 'Preenche task_assignees a partir do texto livre de assigned_to das tarefas existentes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Tarefas processadas por lote.')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas conta os vínculos que seriam criados.')
+
+    def handle(self, *args, **options):
+        users = assignable_users()
+        batch_size = max(options['batch_size'], 1)
+        qs = TaskDemand.objects.exclude(assigned_to__isnull=True).exclude(assigned_to='').order_by('id')
+
+        last_id = 0
+        tasks_seen = 0
+        links = 0
+        unmatched = 0
+        while True:
+            batch = list(qs.filter(id__gt=last_id).values_list('id', 'assigned_to')[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            now = timezone.now()
+            rows = []
+            for task_id, assigned_to in batch:
+                user_ids = match_assignees(assigned_to, users)
+                if not user_ids:
+                    unmatched += 1
+                rows.extend(TaskAssignee(task_id=task_id, user_id=uid, created_at=now) for uid in user_ids)
+            tasks_seen += len(batch)
+            links += len(rows)
+            if rows and not options['dry_run']:
+                TaskAssignee.objects.bulk_create(rows, ignore_conflicts=True)
+
+        prefix = '[dry-run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}Tarefas analisadas: {tasks_seen} | vínculos: {links} | sem correspondência: {unmatched}'
+        ))
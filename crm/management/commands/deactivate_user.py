@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.auth import destroy_user_sessions
+from crm.models import User
+
+
+class Command(BaseCommand):
+    help = 'Desativa um usuário e encerra todas as sessões dele (vale na hora em todos os workers).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='E-mail do usuário.')
+
+    def handle(self, *args, **options):
+        email = options['email'].strip().lower()
+        user = User.objects.filter(email=email).first()
+        if not user:
+            raise CommandError(f'Usuário não encontrado: {email}')
+        User.objects.filter(id=user.id).update(active=False)
+        sessions = destroy_user_sessions(user.id)
+        self.stdout.write(self.style.SUCCESS(f'Usuário {email} desativado. Sessões encerradas: {sessions}'))
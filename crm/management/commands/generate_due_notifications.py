@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from crm.models import TaskDemand, TaskNotification
+from crm.notifications import create_notifications
+
+
+class Command(BaseCommand):
+    help = 'Gera notificações de tarefas que vencem amanhã ou estão atrasadas (agendar via cron, ex.: de hora em hora).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Notificações inseridas por lote.')
+
+    def handle(self, *args, **options):
+        today = timezone.now().date()
+        tomorrow = today + timezone.timedelta(days=1)
+        batch_size = max(options['batch_size'], 1)
+
+        due_soon = TaskDemand.objects.filter(due_date=tomorrow)
+        overdue = (
+            TaskDemand.objects.filter(due_date__lt=today)
+            .exclude(stage__category='done')
+        )
+
+        sources = [
+            ('due_soon', due_soon, tomorrow, "Tarefa '{title}' vence amanhã."),
+            ('overdue', overdue, today, "Tarefa '{title}' está atrasada."),
+        ]
+        candidates = {}
+        created = 0
+        for event_type, qs, day, text in sources:
+            tag = f"[{event_type.upper()}:{day.isoformat()}]"
+            batch = []
+            candidates[event_type] = 0
+            for task_id, team_id, title in qs.values_list('id', 'team_id', 'title').iterator(chunk_size=batch_size):
+                batch.append(TaskNotification(
+                    task_id=task_id,
+                    team_id=team_id,
+                    event_type=event_type,
+                    message=f"{tag} {text.format(title=title)}",
+                    created_at=timezone.now(),
+                    read=False,
+                    dedup_key=f"{event_type}:{task_id}:{day.isoformat()}",
+                ))
+                candidates[event_type] += 1
+                if len(batch) >= batch_size:
+                    created += create_notifications(batch, ignore_conflicts=True)
+                    batch = []
+            if batch:
+                created += create_notifications(batch, ignore_conflicts=True)
+
+        # Tarefas já notificadas no dia são ignoradas pela constraint única de dedup_key.
+        self.stdout.write(self.style.SUCCESS(
+            f"Tarefas verificadas: vence amanhã={candidates['due_soon']}, atrasadas={candidates['overdue']}, novas={created}"
+        ))
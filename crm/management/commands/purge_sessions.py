@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from crm.cache import prune_expired
+from crm.models import ApiTokenRevocation, Session
+
+
+class Command(BaseCommand):
+    help = 'Remove sessões expiradas em lotes (e revogações de tokens de API e entradas do cache já expiradas).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Sessões removidas por lote.')
+        parser.add_argument('--max-batches', type=int, default=0, help='Para após N lotes (0 = sem limite).')
+        parser.add_argument('--sleep', type=float, default=0.0, help='Pausa em segundos entre lotes.')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas mostra estatísticas, sem remover nada.')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        batch_size = max(options['batch_size'], 1)
+        expired = Session.objects.filter(expires_at__lte=now)
+
+        if options['dry_run']:
+            total = Session.objects.count()
+            n_expired = expired.count()
+            oldest = expired.order_by('expires_at').values_list('expires_at', flat=True).first()
+            self.stdout.write(f'Sessões: {total} | expiradas: {n_expired} | ativas: {total - n_expired}')
+            if oldest:
+                self.stdout.write(f'Expiração mais antiga: {oldest.isoformat()}')
+            self.stdout.write(f'Lotes necessários (batch={batch_size}): {-(-n_expired // batch_size)}')
+            self.stdout.write(f'Revogações de token expiradas: {ApiTokenRevocation.objects.filter(expires_at__lte=now).count()}')
+            return
+
+        deleted = 0
+        batches = 0
+        started = time.monotonic()
+        while True:
+            ids = list(expired.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            n, _ = Session.objects.filter(id__in=ids).delete()
+            deleted += n
+            batches += 1
+            if options['max_batches'] and batches >= options['max_batches']:
+                break
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        revocations, _ = ApiTokenRevocation.objects.filter(expires_at__lte=now).delete()
+        cache_entries = prune_expired()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Sessões expiradas removidas: {deleted} em {batches} lote(s), {elapsed:.1f}s. '
+            f'Revogações removidas: {revocations}. Entradas de cache expiradas: {cache_entries}'
+        ))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from crm.models import Client, ClientSearchIndex
+from crm.search import refresh_client_search
+
+
+class Command(BaseCommand):
+    help = 'Recria o índice de busca de clientes (client_search_index) a partir de clients e client_contacts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Clientes por lote.')
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        last_id = ''
+        total = 0
+        while True:
+            ids = list(Client.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            total += refresh_client_search(ids)
+            last_id = ids[-1]
+        orphans, _ = ClientSearchIndex.objects.exclude(client_id__in=Client.objects.values('id')).delete()
+        self.stdout.write(self.style.SUCCESS(f'Clientes indexados: {total} | entradas órfãs removidas: {orphans}'))
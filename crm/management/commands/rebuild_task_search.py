@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from crm.models import TaskDemand
+from crm.search import refresh_task_search
+
+
+class Command(BaseCommand):
+    help = 'Recria os documentos de busca (task_search_documents) de todas as tarefas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Tarefas por lote.')
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        last_id = 0
+        total = 0
+        while True:
+            ids = list(TaskDemand.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            total += refresh_task_search(ids)
+            last_id = ids[-1]
+        self.stdout.write(self.style.SUCCESS(f'Documentos de busca atualizados: {total}'))
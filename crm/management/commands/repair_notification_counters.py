@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from crm.models import NotificationReceipt, UserNotificationCounter
+from crm.notifications import recount_counters
+
+
+class Command(BaseCommand):
+    help = 'Recalcula os contadores de notificações não lidas a partir dos recibos (reparo).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Usuários recalculados por transação.')
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        user_ids = set(UserNotificationCounter.objects.values_list('user_id', flat=True))
+        user_ids |= set(NotificationReceipt.objects.filter(read_at__isnull=True).values_list('user_id', flat=True).distinct())
+        user_ids = sorted(user_ids, key=str)
+        total = 0
+        for i in range(0, len(user_ids), batch_size):
+            total += recount_counters(user_ids[i:i + batch_size])
+        self.stdout.write(self.style.SUCCESS(f'Contadores recalculados: {total}'))
@@ -0,0 +1,45 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from crm.models import TaskNotification, TaskNotificationArchive
+from crm.notifications import archive_notifications, purge_archive
+
+
+class Command(BaseCommand):
+    help = 'Move notificações antigas para task_notifications_archive e limpa o arquivo (agendar via cron, 1x ao dia).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Mantém na tabela principal os últimos N dias (padrão: CRM_NOTIFICATION_RETENTION_DAYS).')
+        parser.add_argument('--archive-days', type=int, default=None, help='Apaga do arquivo o que tiver mais de N dias (padrão: CRM_NOTIFICATION_ARCHIVE_DAYS; 0 = nunca).')
+        parser.add_argument('--no-archive', action='store_true', help='Apaga direto, sem copiar para o arquivo.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Notificações movidas por transação.')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas mostra quantas linhas seriam afetadas.')
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else getattr(settings, 'CRM_NOTIFICATION_RETENTION_DAYS', 90)
+        archive_days = options['archive_days'] if options['archive_days'] is not None else getattr(settings, 'CRM_NOTIFICATION_ARCHIVE_DAYS', 730)
+        # As chaves de deduplicação dos jobs valem por dia: manter ao menos 2 dias.
+        if days < 2:
+            raise CommandError('--days deve ser >= 2.')
+
+        now = timezone.now()
+        cutoff = now - timezone.timedelta(days=days)
+        archive_cutoff = now - timezone.timedelta(days=archive_days) if archive_days > 0 else None
+
+        if options['dry_run']:
+            self.stdout.write(f'Notificações anteriores a {cutoff.date().isoformat()}: {TaskNotification.objects.filter(created_at__lt=cutoff).count()}')
+            if archive_cutoff:
+                self.stdout.write(f'Arquivo anterior a {archive_cutoff.date().isoformat()}: {TaskNotificationArchive.objects.filter(created_at__lt=archive_cutoff).count()}')
+            return
+
+        started = time.monotonic()
+        moved = archive_notifications(cutoff, batch_size=max(options['batch_size'], 1), keep_archive=not options['no_archive'])
+        purged = purge_archive(archive_cutoff) if archive_cutoff else 0
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Notificações {'removidas' if options['no_archive'] else 'arquivadas'}: {moved}. "
+            f'Removidas do arquivo: {purged}. {elapsed:.1f}s'
+        ))
@@ -0,0 +1,79 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from crm.automations import process_outbox_batch
+from crm.models import AutomationOutbox
+
+
+class Command(BaseCommand):
+    help = 'Executa as automações de estágio enfileiradas em automation_outbox (pode rodar em várias instâncias).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Itens travados e executados por transação.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Espera em segundos quando a fila está vazia.')
+        parser.add_argument('--max-attempts', type=int, default=5, help='Tentativas antes de marcar como falha.')
+        parser.add_argument('--backoff', type=float, default=5.0, help='Espera base (s) entre tentativas; dobra a cada falha.')
+        parser.add_argument('--report-every', type=int, default=60, help='Intervalo (s) do relatório de latência.')
+        parser.add_argument('--keep-done-hours', type=int, default=24, help='Remove itens executados há mais de N horas (0 = mantém).')
+        parser.add_argument('--once', action='store_true', help='Esvazia a fila disponível e sai.')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        batch_size = max(options['batch_size'], 1)
+        stats = {}
+        last_report = time.monotonic()
+
+        while not self.stopping:
+            close_old_connections()
+            try:
+                results = process_outbox_batch(batch_size, options['max_attempts'], options['backoff'])
+            except Exception as exc:
+                self.stderr.write(f'Falha no lote: {type(exc).__name__}: {exc}')
+                results = []
+                time.sleep(options['interval'])
+
+            for automation_id, latency, ok in results:
+                s = stats.setdefault(automation_id, {'ok': 0, 'failed': 0, 'latencies': []})
+                s['ok' if ok else 'failed'] += 1
+                s['latencies'].append(latency)
+
+            if time.monotonic() - last_report >= options['report_every']:
+                self._report(stats)
+                self._purge_done(options['keep_done_hours'])
+                stats = {}
+                last_report = time.monotonic()
+
+            if not results:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+
+        self._report(stats)
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+
+    def _purge_done(self, hours):
+        if hours > 0:
+            cutoff = timezone.now() - timezone.timedelta(hours=hours)
+            AutomationOutbox.objects.filter(status='done', processed_at__lt=cutoff).delete()
+
+    def _report(self, stats):
+        pending = AutomationOutbox.objects.filter(status='pending').count()
+        failed = AutomationOutbox.objects.filter(status='failed').count()
+        self.stdout.write(f'[{timezone.now().isoformat(timespec="seconds")}] fila pendente={pending} falhas={failed}')
+        # Latência = tempo entre o enfileiramento (commit da mudança de estágio) e a execução.
+        for automation_id, s in sorted(stats.items(), key=lambda kv: str(kv[0])):
+            lat = sorted(s['latencies'])
+            p95 = lat[min(len(lat) - 1, int(len(lat) * 0.95))]
+            self.stdout.write(
+                f'  automação {automation_id}: ok={s["ok"]} falhas={s["failed"]} '
+                f'latência média={sum(lat) / len(lat):.2f}s p95={p95:.2f}s máx={lat[-1]:.2f}s'
+            )
@@ -0,0 +1,124 @@
+import heapq
+import signal
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from crm import events
+from crm.cache import get_version
+from crm.models import TaskRecurrenceRule
+from crm.recurrence import VERSION_NAME, run_due_recurrences, upcoming_runs
+
+
+class Command(BaseCommand):
+    help = 'Agendador residente de recorrências: dorme até o próximo next_run_at e executa as regras no horário.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Regras travadas e executadas por transação.')
+        parser.add_argument('--workers', type=int, default=1, help='Threads executando lotes em paralelo.')
+        parser.add_argument(
+            '--max-backfill', type=int, default=getattr(settings, 'CRM_RECURRENCE_MAX_BACKFILL', 7),
+            help='Execuções perdidas (ex.: agendador parado) repostas por regra; o excedente é pulado.',
+        )
+        parser.add_argument('--check-every', type=float, default=30.0, help='Intervalo (s) de conferência do carimbo de versão.')
+        parser.add_argument('--refresh', type=float, default=300.0, help='Recarrega as regras a cada N segundos mesmo sem aviso.')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        self.sub = events.subscribe()
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        try:
+            self._loop(options)
+        finally:
+            events.unsubscribe(self.sub)
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+        self.sub.put({'kind': 'stop'})
+
+    def _load(self):
+        close_old_connections()
+        self.version = get_version(VERSION_NAME)
+        self.loaded_at = time.monotonic()
+        self.heap = upcoming_runs()
+        # Horário vigente por regra; entradas do heap que não batem com ele estão obsoletas.
+        self.next_at = {rule_id: run_at for run_at, rule_id in self.heap}
+        heapq.heapify(self.heap)
+
+    def _push(self, rule_id, run_at):
+        self.next_at[rule_id] = run_at
+        heapq.heappush(self.heap, (run_at, rule_id))
+
+    def _pop_due(self, now):
+        due = set()
+        while self.heap and self.heap[0][0] <= now:
+            run_at, rule_id = heapq.heappop(self.heap)
+            if self.next_at.get(rule_id) == run_at:
+                due.add(rule_id)
+        return due
+
+    def _requeue(self, missed, now):
+        """Regras vencidas que esta execução não avançou: travadas por outra instância, desativadas ou removidas."""
+        for rule_id in missed:
+            self.next_at.pop(rule_id, None)
+        retry = now + timedelta(seconds=1)
+        rows = TaskRecurrenceRule.objects.filter(id__in=missed, active=True).values_list('next_run_at', 'id')
+        for run_at, rule_id in rows:
+            # Ainda vencida (a outra instância não terminou): tenta de novo em 1s.
+            self._push(rule_id, retry if run_at <= now else run_at)
+
+    def _run_due(self, due, now, options):
+        close_old_connections()
+        try:
+            report = run_due_recurrences(
+                batch_size=max(options['batch_size'], 1),
+                workers=max(options['workers'], 1),
+                actor='recurrence-scheduler',
+                catch_up=max(options['max_backfill'], 1),
+            )
+        except Exception as exc:
+            self.stderr.write(f'Falha ao executar recorrências: {type(exc).__name__}: {exc}')
+            retry = now + timedelta(seconds=1)
+            for rule_id in due:
+                self._push(rule_id, retry)
+            return
+        if report['rules']:
+            self.stdout.write(
+                f'[{now.isoformat(timespec="seconds")}] {report["rules"]} regra(s), '
+                f'{report["tasks"]} tarefa(s) em {report["elapsed"]:.2f}s'
+            )
+        for rule_id, run_at in report['advanced'].items():
+            self._push(rule_id, run_at)
+        missed = due - report['advanced'].keys()
+        if missed:
+            self._requeue(missed, now)
+
+    def _loop(self, options):
+        # Na partida as regras atrasadas já estão vencidas no heap: a reposição acontece na primeira volta.
+        self._load()
+        self.stdout.write(f'Agendador iniciado: {len(self.heap)} regra(s) ativa(s).')
+        while not self.stopping:
+            now = timezone.now()
+            due = self._pop_due(now)
+            if due:
+                # Só as regras executadas voltam ao heap; recarga completa fica para avisos e o refresh periódico.
+                self._run_due(due, now, options)
+                continue
+
+            timeout = options['check_every']
+            if self.heap:
+                timeout = min(timeout, (self.heap[0][0] - now).total_seconds())
+            received = self.sub.wait(max(timeout, 0))
+            if self.stopping:
+                break
+            if (
+                any(e.get('kind') in ('recurrences', 'resync') for e in received)
+                or get_version(VERSION_NAME) != self.version
+                or time.monotonic() - self.loaded_at >= options['refresh']
+            ):
+                self._load()
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.utils import timezone
+
+from crm.models import TaskDemand, WorkloadSnapshot
+
+
+class Command(BaseCommand):
+    help = 'Grava a fotografia de hoje da carga por equipe/categoria de estágio (agendar via cron, 1x ao dia ou mais).'
+
+    def handle(self, *args, **options):
+        # Só o dia corrente: o estado das tarefas é o atual, então não há como reconstruir dias passados.
+        # Uma agregação agrupada por dia; somar deltas das tarefas alteradas não serve, porque
+        # "atrasada" muda com a data sem a tarefa mudar e exclusões não deixam rastro.
+        day = timezone.now().date()
+        counts = (
+            TaskDemand.objects.filter(team__isnull=False)
+            .values('team_id', 'stage__category')
+            .annotate(
+                task_count=models.Count('id'),
+                overdue_count=models.Count('id', filter=models.Q(due_date__lt=day) & ~models.Q(stage__category='done')),
+                created_count=models.Count('id', filter=models.Q(created_at__date=day)),
+            )
+            .order_by()
+        )
+        now = timezone.now()
+        rows = [
+            WorkloadSnapshot(
+                day=day,
+                team_id=r['team_id'],
+                category=r['stage__category'],
+                task_count=r['task_count'],
+                overdue_count=r['overdue_count'],
+                created_count=r['created_count'],
+                created_at=now,
+            )
+            for r in counts
+        ]
+
+        # Reexecutar no mesmo dia substitui a fotografia daquele dia.
+        with transaction.atomic():
+            WorkloadSnapshot.objects.filter(day=day).delete()
+            WorkloadSnapshot.objects.bulk_create(rows)
+
+        self.stdout.write(self.style.SUCCESS(f'Fotografia de {day.isoformat()}: {len(rows)} linhas'))
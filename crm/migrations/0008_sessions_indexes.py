@@ -0,0 +1,35 @@
+from django.db import migrations
+
+INDEXES = [
+    ('sessions_expires_at_idx', 'expires_at'),
+    ('sessions_user_id_idx', 'user_id'),
+]
+
+
+def create_indexes(apps, schema_editor):
+    # A tabela sessions pertence ao schema externo em Postgres (managed=False);
+    # em outros bancos de desenvolvimento ela não existe.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, column in INDEXES:
+        schema_editor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON sessions ({column})')
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY não pode rodar dentro de transação.
+    atomic = False
+
+    dependencies = [
+        ('crm', '0007_apitokenrevocation'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0008_sessions_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskAssignee',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.UUIDField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assignees', to='crm.taskdemand')),
+            ],
+            options={
+                'db_table': 'task_assignees',
+                'ordering': ['created_at'],
+                'unique_together': {('task', 'user_id')},
+                'indexes': [models.Index(fields=['user_id', 'task'], name='task_assignees_user_task_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+import re
+
+from django.db import migrations, models
+from django.utils import timezone
+
+KEY_RE = re.compile(r'^\[(DUE_SOON|OVERDUE):(\d{4}-\d{2}-\d{2})\]')
+
+
+def fill_recent_keys(apps, schema_editor):
+    # Só as chaves dos últimos dias importam para a deduplicação (são por data).
+    TaskNotification = apps.get_model('crm', 'TaskNotification')
+    since = timezone.now() - timezone.timedelta(days=2)
+    seen = set()
+    qs = TaskNotification.objects.filter(event_type__in=['due_soon', 'overdue'], created_at__gte=since).order_by('id')
+    for n in qs.iterator():
+        m = KEY_RE.match(n.message or '')
+        if not m:
+            continue
+        key = f"{n.event_type}:{n.task_id}:{m.group(2)}"
+        if key in seen:
+            continue
+        seen.add(key)
+        TaskNotification.objects.filter(id=n.id).update(dedup_key=key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0009_taskassignee'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tasknotification',
+            name='dedup_key',
+            field=models.CharField(blank=True, max_length=120, null=True, unique=True),
+        ),
+        migrations.RunPython(fill_recent_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVectorField
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0010_tasknotification_dedup_key'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.CreateModel(
+            name='TaskSearchDocument',
+            fields=[
+                ('task', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='crm.taskdemand')),
+                ('title', models.TextField(blank=True, default='')),
+                ('client_name', models.TextField(blank=True, default='')),
+                ('description', models.TextField(blank=True, default='')),
+                ('comments', models.TextField(blank=True, default='')),
+                ('document', SearchVectorField(null=True)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'task_search_documents',
+                'indexes': [
+                    GinIndex(fields=['document'], name='task_search_document_gin'),
+                    GinIndex(fields=['title'], name='task_search_title_trgm', opclasses=['gin_trgm_ops']),
+                ],
+            },
+        ),
+    ]
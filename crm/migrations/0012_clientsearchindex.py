@@ -0,0 +1,49 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def create_contacts_index(apps, schema_editor):
+    # client_contacts pertence ao schema externo em Postgres (managed=False).
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS client_contacts_client_id_idx ON client_contacts (client_id)')
+
+
+def drop_contacts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS client_contacts_client_id_idx')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY não pode rodar dentro de transação.
+    atomic = False
+
+    dependencies = [
+        ('crm', '0011_tasksearchdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientSearchIndex',
+            fields=[
+                ('client_id', models.TextField(primary_key=True, serialize=False)),
+                ('name', models.TextField(blank=True, default='')),
+                ('cnpj_digits', models.CharField(blank=True, default='', max_length=32)),
+                ('contact_emails', models.TextField(blank=True, default='')),
+                ('contact_phones', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'client_search_index',
+                'indexes': [
+                    GinIndex(fields=['name'], name='client_search_name_trgm', opclasses=['gin_trgm_ops']),
+                    models.Index(fields=['cnpj_digits'], name='client_search_cnpj_idx', opclasses=['varchar_pattern_ops']),
+                    GinIndex(fields=['contact_emails'], name='client_search_emails_trgm', opclasses=['gin_trgm_ops']),
+                    GinIndex(fields=['contact_phones'], name='client_search_phones_trgm', opclasses=['gin_trgm_ops']),
+                ],
+            },
+        ),
+        migrations.RunPython(create_contacts_index, drop_contacts_index),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations, models
+
+# Cópia congelada das regras de TaskStage.guess_category (mesmos termos do antigo filtro por nome).
+NAME_HINTS = [
+    ('done', ('concl', 'done')),
+    ('doing', ('produção', 'producao', 'doing')),
+    ('queue', ('fila', 'todo')),
+]
+
+
+def classify_stages(apps, schema_editor):
+    TaskStage = apps.get_model('crm', 'TaskStage')
+    for stage in TaskStage.objects.all():
+        lowered = (stage.name or '').lower()
+        category = 'backlog'
+        for cat, terms in NAME_HINTS:
+            if any(t in lowered for t in terms):
+                category = cat
+                break
+        if category != stage.category:
+            TaskStage.objects.filter(id=stage.id).update(category=category)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0012_clientsearchindex'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskstage',
+            name='category',
+            field=models.CharField(choices=[('backlog', 'Backlog'), ('queue', 'Fila'), ('doing', 'Em produção'), ('done', 'Concluído')], db_index=True, default='backlog', max_length=20),
+        ),
+        migrations.RunPython(classify_stages, migrations.RunPython.noop),
+    ]
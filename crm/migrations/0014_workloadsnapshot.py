@@ -0,0 +1,32 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0013_taskstage_category'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkloadSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('category', models.CharField(choices=[('backlog', 'Backlog'), ('queue', 'Fila'), ('doing', 'Em produção'), ('done', 'Concluído')], max_length=20)),
+                ('task_count', models.PositiveIntegerField(default=0)),
+                ('overdue_count', models.PositiveIntegerField(default=0)),
+                ('created_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='workload_snapshots', to='crm.team')),
+            ],
+            options={
+                'db_table': 'workload_snapshots',
+                'ordering': ['day'],
+                'unique_together': {('day', 'team', 'category')},
+                'indexes': [models.Index(fields=['team', 'day'], name='workload_snap_team_day_idx')],
+            },
+        ),
+    ]
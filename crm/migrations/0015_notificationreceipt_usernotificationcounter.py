@@ -0,0 +1,82 @@
+import uuid
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_unread(apps, schema_editor):
+    # Distribui as notificações não lidas recentes (regra global antiga) para quem as enxerga.
+    TaskNotification = apps.get_model('crm', 'TaskNotification')
+    NotificationReceipt = apps.get_model('crm', 'NotificationReceipt')
+    UserNotificationCounter = apps.get_model('crm', 'UserNotificationCounter')
+    TeamMember = apps.get_model('crm', 'TeamMember')
+
+    since = django.utils.timezone.now() - django.utils.timezone.timedelta(days=30)
+    pending = list(TaskNotification.objects.filter(read=False, created_at__gte=since).values_list('id', 'team_id'))
+    if not pending:
+        return
+
+    # users é uma tabela não gerenciada (fora do estado das migrations).
+    with schema_editor.connection.cursor() as cur:
+        cur.execute('SELECT id, is_admin FROM users WHERE active')
+        active = {uuid.UUID(str(uid)): bool(is_admin) for uid, is_admin in cur.fetchall()}
+    admins = {uid for uid, is_admin in active.items() if is_admin}
+    members = {}
+    for team_id, user_id in TeamMember.objects.filter(user_id__isnull=False).values_list('team_id', 'user_id'):
+        if user_id in active:
+            members.setdefault(team_id, set()).add(user_id)
+
+    counts = {}
+    batch = []
+    for notification_id, team_id in pending:
+        recipients = set(active) if team_id is None else admins | members.get(team_id, set())
+        for user_id in recipients:
+            batch.append(NotificationReceipt(notification_id=notification_id, user_id=user_id))
+            counts[user_id] = counts.get(user_id, 0) + 1
+        if len(batch) >= 1000:
+            NotificationReceipt.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        NotificationReceipt.objects.bulk_create(batch, ignore_conflicts=True)
+    UserNotificationCounter.objects.bulk_create(
+        [UserNotificationCounter(user_id=uid, unread=n) for uid, n in counts.items()],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0014_workloadsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserNotificationCounter',
+            fields=[
+                ('user_id', models.UUIDField(primary_key=True, serialize=False)),
+                ('unread', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'user_notification_counters',
+            },
+        ),
+        migrations.CreateModel(
+            name='NotificationReceipt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.UUIDField()),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='receipts', to='crm.tasknotification')),
+            ],
+            options={
+                'db_table': 'notification_receipts',
+                'unique_together': {('notification', 'user_id')},
+                'indexes': [models.Index(condition=models.Q(('read_at__isnull', True)), fields=['user_id'], name='notif_receipts_unread_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_unread, migrations.RunPython.noop),
+    ]
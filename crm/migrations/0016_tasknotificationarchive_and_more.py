@@ -0,0 +1,41 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0015_notificationreceipt_usernotificationcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskNotificationArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('task_id', models.IntegerField()),
+                ('team_id', models.IntegerField(blank=True, null=True)),
+                ('event_type', models.CharField(max_length=40)),
+                ('message', models.TextField()),
+                ('created_at', models.DateTimeField()),
+                ('dedup_key', models.CharField(blank=True, max_length=120, null=True)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'task_notifications_archive',
+                'ordering': ['-created_at'],
+                'indexes': [
+                    models.Index(fields=['created_at'], name='task_notif_arch_created_idx'),
+                    models.Index(fields=['task_id'], name='task_notif_arch_task_idx'),
+                ],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='tasknotification',
+            index=models.Index(fields=['-created_at', '-id'], name='task_notif_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tasknotification',
+            index=models.Index(fields=['team', '-created_at'], name='task_notif_team_created_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0016_tasknotificationarchive_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AutomationOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_stage_id', models.IntegerField(blank=True, null=True)),
+                ('new_stage_id', models.IntegerField(blank=True, null=True)),
+                ('actor', models.TextField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pendente'), ('done', 'Executada'), ('failed', 'Falhou')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('automation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='outbox', to='crm.taskautomation')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='automation_outbox', to='crm.taskdemand')),
+            ],
+            options={
+                'db_table': 'automation_outbox',
+                'ordering': ['id'],
+                'indexes': [
+                    models.Index(condition=models.Q(('status', 'pending')), fields=['available_at', 'id'], name='automation_outbox_pending_idx'),
+                    models.Index(condition=models.Q(('status', 'done')), fields=['processed_at'], name='automation_outbox_done_idx'),
+                ],
+            },
+        ),
+    ]
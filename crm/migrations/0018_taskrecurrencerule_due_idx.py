@@ -0,0 +1,23 @@
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_next_run(apps, schema_editor):
+    # Regras antigas sem next_run_at eram tratadas como vencidas; agora o horário é explícito.
+    TaskRecurrenceRule = apps.get_model('crm', 'TaskRecurrenceRule')
+    TaskRecurrenceRule.objects.filter(next_run_at__isnull=True).update(next_run_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0017_automationoutbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_next_run, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='taskrecurrencerule',
+            index=models.Index(fields=['active', 'next_run_at'], name='task_recur_due_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations
+
+# Mesmo conteúdo de crm.search.refresh_task_search, em SQL para não depender do código atual
+# (HTML removido por expressão regular; rebuild_task_search regera com o texto exato).
+BACKFILL_DOCUMENTS = r"""
+INSERT INTO task_search_documents (task_id, title, client_name, description, comments, updated_at)
+SELECT
+    t.id,
+    COALESCE(t.title, ''),
+    COALESCE(c.name, ''),
+    btrim(regexp_replace(regexp_replace(COALESCE(t.description, ''), '<[^>]*>', ' ', 'g'), '\s+', ' ', 'g')),
+    COALESCE((
+        SELECT string_agg(btrim(regexp_replace(regexp_replace(tc.comment, '<[^>]*>', ' ', 'g'), '\s+', ' ', 'g')), E'\n' ORDER BY tc.created_at)
+        FROM task_comments tc
+        WHERE tc.task_id = t.id AND tc.comment NOT LIKE '[AUTO%%'
+    ), ''),
+    now()
+FROM task_demands t
+LEFT JOIN clients c ON c.id::text = t.client_id
+ON CONFLICT (task_id) DO NOTHING
+"""
+
+BACKFILL_VECTORS = """
+UPDATE task_search_documents SET document =
+    setweight(to_tsvector('portuguese', title), 'A')
+    || setweight(to_tsvector('portuguese', client_name), 'B')
+    || setweight(to_tsvector('portuguese', description), 'C')
+    || setweight(to_tsvector('portuguese', comments), 'D')
+WHERE document IS NULL
+"""
+
+
+def backfill(apps, schema_editor):
+    # tsvector e a tabela clients só existem no Postgres.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(BACKFILL_DOCUMENTS)
+    schema_editor.execute(BACKFILL_VECTORS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0018_taskrecurrencerule_due_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
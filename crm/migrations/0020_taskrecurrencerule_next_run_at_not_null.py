@@ -0,0 +1,24 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def fill_next_run(apps, schema_editor):
+    # Regras gravadas sem next_run_at depois da 0018 (ex.: por fora do CRM) ficam vencidas agora.
+    TaskRecurrenceRule = apps.get_model('crm', 'TaskRecurrenceRule')
+    TaskRecurrenceRule.objects.filter(next_run_at__isnull=True).update(next_run_at=django.utils.timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0019_backfill_task_search_documents'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_next_run, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='taskrecurrencerule',
+            name='next_run_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
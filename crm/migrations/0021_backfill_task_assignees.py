@@ -0,0 +1,47 @@
+import uuid
+
+from django.db import migrations
+import django.utils.timezone
+
+
+def backfill_assignees(apps, schema_editor):
+    # Mesma regra de crm.assignees.match_assignees: e-mail ou nome completo citado em assigned_to.
+    TaskDemand = apps.get_model('crm', 'TaskDemand')
+    TaskAssignee = apps.get_model('crm', 'TaskAssignee')
+
+    # users é uma tabela não gerenciada (fora do estado das migrations).
+    with schema_editor.connection.cursor() as cur:
+        cur.execute('SELECT id, email, name FROM users')
+        users = [
+            (uuid.UUID(str(uid)), (email or '').strip().lower(), (name or '').strip().lower())
+            for uid, email, name in cur.fetchall()
+        ]
+    if not users:
+        return
+
+    now = django.utils.timezone.now()
+    qs = TaskDemand.objects.exclude(assigned_to__isnull=True).exclude(assigned_to='').order_by('id')
+    last_id = 0
+    while True:
+        batch = list(qs.filter(id__gt=last_id).values_list('id', 'assigned_to')[:1000])
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        rows = [
+            TaskAssignee(task_id=task_id, user_id=uid, created_at=now)
+            for task_id, assigned_to in batch
+            for uid, email, name in users
+            if (email and email in assigned_to.lower()) or (name and name in assigned_to.lower())
+        ]
+        TaskAssignee.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0020_taskrecurrencerule_next_run_at_not_null'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_assignees, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db import migrations
+from django.db.models.functions import Upper
+
+# title__icontains compila para UPPER(title) LIKE UPPER(q): o índice precisa ser na expressão.
+INDEX = GinIndex(OpClass(Upper('title'), name='gin_trgm_ops'), name='task_search_title_upper_trgm')
+
+
+def create_index(apps, schema_editor):
+    # Índice de expressão com opclass só existe no Postgres (o sqlite de desenvolvimento não o entende).
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.add_index(apps.get_model('crm', 'TaskSearchDocument'), INDEX)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.remove_index(apps.get_model('crm', 'TaskSearchDocument'), INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0021_backfill_task_assignees'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[migrations.AddIndex(model_name='tasksearchdocument', index=INDEX)],
+            database_operations=[migrations.RunPython(create_index, drop_index)],
+        ),
+    ]
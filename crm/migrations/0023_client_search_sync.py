@@ -0,0 +1,114 @@
+from django.db import migrations
+
+# clients e client_contacts são escritas também fora do CRM (managed=False): os gatilhos mantêm
+# client_search_index em dia no próprio banco, com a mesma normalização de
+# crm.search.refresh_client_search (nome em minúsculas, só dígitos no CNPJ e nos telefones).
+CREATE_SQL = [r"""
+CREATE OR REPLACE FUNCTION crm_refresh_client_search(cid text) RETURNS void AS $$
+BEGIN
+    IF cid IS NULL THEN
+        RETURN;
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM clients WHERE id::text = cid) THEN
+        DELETE FROM client_search_index WHERE client_id = cid;
+        RETURN;
+    END IF;
+    INSERT INTO client_search_index (client_id, name, cnpj_digits, contact_emails, contact_phones, updated_at)
+    SELECT
+        c.id::text,
+        lower(btrim(COALESCE(c.name, ''))),
+        regexp_replace(COALESCE(c.cnpj, ''), '\D', '', 'g'),
+        COALESCE((
+            SELECT string_agg(lower(btrim(cc.email)), ' ')
+            FROM client_contacts cc
+            WHERE cc.client_id::text = cid AND COALESCE(cc.email, '') <> ''
+        ), ''),
+        COALESCE((
+            SELECT string_agg(regexp_replace(cc.phone, '\D', '', 'g'), ' ')
+            FROM client_contacts cc
+            WHERE cc.client_id::text = cid AND regexp_replace(COALESCE(cc.phone, ''), '\D', '', 'g') <> ''
+        ), ''),
+        now()
+    FROM clients c
+    WHERE c.id::text = cid
+    ON CONFLICT (client_id) DO UPDATE SET
+        name = EXCLUDED.name,
+        cnpj_digits = EXCLUDED.cnpj_digits,
+        contact_emails = EXCLUDED.contact_emails,
+        contact_phones = EXCLUDED.contact_phones,
+        updated_at = EXCLUDED.updated_at;
+END
+$$ LANGUAGE plpgsql
+""", r"""
+CREATE OR REPLACE FUNCTION crm_clients_search_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.id IS DISTINCT FROM NEW.id) THEN
+        PERFORM crm_refresh_client_search(OLD.id::text);
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        PERFORM crm_refresh_client_search(NEW.id::text);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+""", r"""
+CREATE OR REPLACE FUNCTION crm_client_contacts_search_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.client_id IS DISTINCT FROM NEW.client_id) THEN
+        PERFORM crm_refresh_client_search(OLD.client_id::text);
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        PERFORM crm_refresh_client_search(NEW.client_id::text);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+""",
+    'DROP TRIGGER IF EXISTS clients_search_sync ON clients',
+    """CREATE TRIGGER clients_search_sync
+    AFTER INSERT OR UPDATE OF id, name, cnpj OR DELETE ON clients
+    FOR EACH ROW EXECUTE FUNCTION crm_clients_search_trigger()""",
+    'DROP TRIGGER IF EXISTS client_contacts_search_sync ON client_contacts',
+    """CREATE TRIGGER client_contacts_search_sync
+    AFTER INSERT OR UPDATE OF client_id, email, phone OR DELETE ON client_contacts
+    FOR EACH ROW EXECUTE FUNCTION crm_client_contacts_search_trigger()""",
+]
+
+BACKFILL_SQL = [
+    'SELECT crm_refresh_client_search(id::text) FROM clients',
+    'DELETE FROM client_search_index WHERE client_id NOT IN (SELECT id::text FROM clients)',
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS client_contacts_search_sync ON client_contacts',
+    'DROP TRIGGER IF EXISTS clients_search_sync ON clients',
+    'DROP FUNCTION IF EXISTS crm_client_contacts_search_trigger()',
+    'DROP FUNCTION IF EXISTS crm_clients_search_trigger()',
+    'DROP FUNCTION IF EXISTS crm_refresh_client_search(text)',
+]
+
+
+def create_sync(apps, schema_editor):
+    # clients/client_contacts pertencem ao schema externo em Postgres; em outros bancos não existem.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in CREATE_SQL + BACKFILL_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_sync(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0022_task_search_title_upper_trgm'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_sync, drop_sync),
+    ]
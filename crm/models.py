@@ -1,4 +1,7 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.functions import Upper
 from django.utils import timezone
 
 
@@ -62,6 +65,26 @@ class ClientLink(models.Model):
         managed = False
 
 
+class ClientSearchIndex(models.Model):
+    """Campos normalizados de busca de clientes e contatos (ver crm.search)."""
+
+    client_id = models.TextField(primary_key=True)
+    name = models.TextField(blank=True, default='')
+    cnpj_digits = models.CharField(max_length=32, blank=True, default='')
+    contact_emails = models.TextField(blank=True, default='')
+    contact_phones = models.TextField(blank=True, default='')
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'client_search_index'
+        indexes = [
+            GinIndex(fields=['name'], name='client_search_name_trgm', opclasses=['gin_trgm_ops']),
+            models.Index(fields=['cnpj_digits'], name='client_search_cnpj_idx', opclasses=['varchar_pattern_ops']),
+            GinIndex(fields=['contact_emails'], name='client_search_emails_trgm', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['contact_phones'], name='client_search_phones_trgm', opclasses=['gin_trgm_ops']),
+        ]
+
+
 class User(models.Model):
     id = models.UUIDField(primary_key=True)
     email = models.TextField(unique=True)
@@ -88,11 +111,36 @@ class Session(models.Model):
         managed = False
 
 
+class ApiTokenRevocation(models.Model):
+    jti = models.CharField(max_length=64, unique=True)
+    user_id = models.UUIDField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'api_token_revocations'
+        ordering = ['-created_at']
+
+
 # ===== Kanban/Tarefas (novo módulo) =====
 class TaskStage(models.Model):
+    CATEGORY_CHOICES = [
+        ('backlog', 'Backlog'),
+        ('queue', 'Fila'),
+        ('doing', 'Em produção'),
+        ('done', 'Concluído'),
+    ]
+    # Termos usados para sugerir a categoria a partir do nome do estágio.
+    CATEGORY_NAME_HINTS = [
+        ('done', ('concl', 'done')),
+        ('doing', ('produção', 'producao', 'doing')),
+        ('queue', ('fila', 'todo')),
+    ]
+
     name = models.CharField(max_length=120, unique=True)
     sort_order = models.PositiveIntegerField(default=0)
     active = models.BooleanField(default=True)
+    category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default='backlog', db_index=True)
     created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
@@ -102,6 +150,14 @@ class TaskStage(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def guess_category(cls, name):
+        lowered = (name or '').lower()
+        for category, terms in cls.CATEGORY_NAME_HINTS:
+            if any(t in lowered for t in terms):
+                return category
+        return 'backlog'
+
 
 class WorkGroup(models.Model):
     name = models.CharField(max_length=140, unique=True)
@@ -187,6 +243,39 @@ class TaskDemand(models.Model):
         return self.title
 
 
+class TaskAssignee(models.Model):
+    task = models.ForeignKey(TaskDemand, on_delete=models.CASCADE, related_name='assignees')
+    user_id = models.UUIDField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'task_assignees'
+        ordering = ['created_at']
+        unique_together = ('task', 'user_id')
+        indexes = [
+            models.Index(fields=['user_id', 'task'], name='task_assignees_user_task_idx'),
+        ]
+
+
+class WorkloadSnapshot(models.Model):
+    """Fotografia diária da carga por equipe e categoria de estágio (ver snapshot_workload)."""
+    day = models.DateField()
+    team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='workload_snapshots')
+    category = models.CharField(max_length=20, choices=TaskStage.CATEGORY_CHOICES)
+    task_count = models.PositiveIntegerField(default=0)
+    overdue_count = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'workload_snapshots'
+        ordering = ['day']
+        unique_together = ('day', 'team', 'category')
+        indexes = [
+            models.Index(fields=['team', 'day'], name='workload_snap_team_day_idx'),
+        ]
+
+
 class TaskComment(models.Model):
     task = models.ForeignKey(TaskDemand, on_delete=models.CASCADE, related_name='comments')
     comment = models.TextField()
@@ -209,6 +298,26 @@ class TaskAttachment(models.Model):
         ordering = ['-created_at']
 
 
+class TaskSearchDocument(models.Model):
+    """Documento de busca mantido por tarefa (ver crm.search)."""
+
+    task = models.OneToOneField(TaskDemand, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    title = models.TextField(blank=True, default='')
+    client_name = models.TextField(blank=True, default='')
+    description = models.TextField(blank=True, default='')
+    comments = models.TextField(blank=True, default='')
+    document = SearchVectorField(null=True)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'task_search_documents'
+        indexes = [
+            GinIndex(fields=['document'], name='task_search_document_gin'),
+            GinIndex(fields=['title'], name='task_search_title_trgm', opclasses=['gin_trgm_ops']),
+            GinIndex(OpClass(Upper('title'), name='gin_trgm_ops'), name='task_search_title_upper_trgm'),
+        ]
+
+
 class TaskAutomation(models.Model):
     ACTION_CHOICES = [
         ('comment', 'Comentário automático'),
@@ -233,6 +342,35 @@ class TaskAutomation(models.Model):
         return self.name
 
 
+class AutomationOutbox(models.Model):
+    """Execuções de automação pendentes, gravadas na mesma transação da mudança de estágio."""
+    STATUS_CHOICES = [
+        ('pending', 'Pendente'),
+        ('done', 'Executada'),
+        ('failed', 'Falhou'),
+    ]
+
+    task = models.ForeignKey(TaskDemand, on_delete=models.CASCADE, related_name='automation_outbox')
+    automation = models.ForeignKey(TaskAutomation, on_delete=models.SET_NULL, null=True, blank=True, related_name='outbox')
+    old_stage_id = models.IntegerField(null=True, blank=True)
+    new_stage_id = models.IntegerField(null=True, blank=True)
+    actor = models.TextField(blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'automation_outbox'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['available_at', 'id'], condition=models.Q(status='pending'), name='automation_outbox_pending_idx'),
+            models.Index(fields=['processed_at'], condition=models.Q(status='done'), name='automation_outbox_done_idx'),
+        ]
+
+
 class TaskRecurrenceRule(models.Model):
     FREQ_CHOICES = [
         ('daily', 'Diária'),
@@ -246,12 +384,15 @@ class TaskRecurrenceRule(models.Model):
     interval = models.PositiveIntegerField(default=1)
     active = models.BooleanField(default=True)
     last_run_at = models.DateTimeField(null=True, blank=True)
-    next_run_at = models.DateTimeField(null=True, blank=True)
+    next_run_at = models.DateTimeField(default=timezone.now)
     created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         db_table = 'task_recurrence_rules'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['active', 'next_run_at'], name='task_recur_due_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -263,8 +404,60 @@ class TaskNotification(models.Model):
     event_type = models.CharField(max_length=40)  # created, stage_changed, comment, due_soon, overdue
     message = models.TextField()
     created_at = models.DateTimeField(default=timezone.now)
+    # Legado: a leitura agora é por usuário (NotificationReceipt).
     read = models.BooleanField(default=False)
+    # Evita notificações repetidas de jobs (ex.: 'overdue:<task_id>:<data>')
+    dedup_key = models.CharField(max_length=120, unique=True, null=True, blank=True)
 
     class Meta:
         db_table = 'task_notifications'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='task_notif_created_idx'),
+            models.Index(fields=['team', '-created_at'], name='task_notif_team_created_idx'),
+        ]
+
+
+class TaskNotificationArchive(models.Model):
+    """Notificações antigas retiradas de task_notifications (ver rotate_notifications)."""
+    id = models.BigIntegerField(primary_key=True)
+    task_id = models.IntegerField()
+    team_id = models.IntegerField(null=True, blank=True)
+    event_type = models.CharField(max_length=40)
+    message = models.TextField()
+    created_at = models.DateTimeField()
+    dedup_key = models.CharField(max_length=120, null=True, blank=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'task_notifications_archive'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='task_notif_arch_created_idx'),
+            models.Index(fields=['task_id'], name='task_notif_arch_task_idx'),
+        ]
+
+
+class NotificationReceipt(models.Model):
+    """Entrega de uma notificação a um usuário; read_at nulo = não lida."""
+    notification = models.ForeignKey(TaskNotification, on_delete=models.CASCADE, related_name='receipts')
+    user_id = models.UUIDField()
+    read_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'notification_receipts'
+        unique_together = ('notification', 'user_id')
+        indexes = [
+            models.Index(fields=['user_id'], condition=models.Q(read_at__isnull=True), name='notif_receipts_unread_idx'),
+        ]
+
+
+class UserNotificationCounter(models.Model):
+    """Contagem de não lidas por usuário, recalculada a cada escrita (ver crm.notifications)."""
+    user_id = models.UUIDField(primary_key=True)
+    unread = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'user_notification_counters'
@@ -0,0 +1,266 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from . import events
+from .models import (
+    NotificationReceipt, TaskNotification, TaskNotificationArchive, TeamMember, User, UserNotificationCounter,
+)
+
+# Acima disso o evento vai sem a lista de usuários (limite de payload do NOTIFY).
+_EVENT_MAX_USERS = 150
+
+
+def _recipients(team_ids):
+    """team_id -> ids dos usuários ativos que enxergam notificações daquela equipe."""
+    active = User.objects.filter(active=True)
+    result = {}
+    if None in team_ids:
+        # Notificação sem equipe é visível para todos.
+        result[None] = set(active.values_list('id', flat=True))
+    team_ids = [t for t in team_ids if t is not None]
+    if not team_ids:
+        return result
+    admins = set(active.filter(is_admin=True).values_list('id', flat=True))
+    for team_id in team_ids:
+        result[team_id] = set(admins)
+    members = TeamMember.objects.filter(team_id__in=team_ids, user_id__in=active.values('id')).values_list('team_id', 'user_id')
+    for team_id, user_id in members:
+        result[team_id].add(user_id)
+    return result
+
+
+def _lock_counters(user_ids):
+    """Garante a linha do contador de cada usuário e trava todas em ordem fixa (sem deadlock)."""
+    user_ids = sorted(set(user_ids), key=str)
+    now = timezone.now()
+    UserNotificationCounter.objects.bulk_create(
+        [UserNotificationCounter(user_id=uid, unread=0, updated_at=now) for uid in user_ids],
+        ignore_conflicts=True,
+    )
+    list(UserNotificationCounter.objects.select_for_update().filter(user_id__in=user_ids).order_by('user_id').values_list('user_id', flat=True))
+    return user_ids
+
+
+def _apply_deltas(deltas):
+    """Soma user_id -> variação de não lidas aos contadores (chamar dentro de transaction.atomic).
+
+    Um UPDATE por valor distinto de variação: numa notificação comum todos recebem +1.
+    """
+    deltas = {uid: n for uid, n in deltas.items() if n}
+    if not deltas:
+        return
+    _lock_counters(deltas)
+    by_delta = {}
+    for uid, n in deltas.items():
+        by_delta.setdefault(n, []).append(uid)
+    now = timezone.now()
+    for n, user_ids in by_delta.items():
+        UserNotificationCounter.objects.filter(user_id__in=user_ids).update(
+            unread=Greatest(models.F('unread') + n, 0),
+            updated_at=now,
+        )
+
+
+def recount_counters(user_ids):
+    """Recalcula os contadores a partir dos recibos (reparo: repair_notification_counters)."""
+    with transaction.atomic():
+        user_ids = _lock_counters(user_ids)
+        if not user_ids:
+            return 0
+        unread = (
+            NotificationReceipt.objects.filter(user_id=models.OuterRef('user_id'), read_at__isnull=True)
+            .order_by()
+            .values('user_id')
+            .annotate(n=models.Count('id'))
+            .values('n')
+        )
+        return UserNotificationCounter.objects.filter(user_id__in=user_ids).update(
+            unread=Coalesce(models.Subquery(unread), 0),
+            updated_at=timezone.now(),
+        )
+
+
+def _publish(user_ids):
+    user_ids = set(user_ids)
+    if user_ids:
+        events.publish('notifications', user_ids=None if len(user_ids) > _EVENT_MAX_USERS else [str(u) for u in user_ids])
+
+
+def create_notifications(notifications, ignore_conflicts=False, batch_size=1000):
+    """Grava notificações, gera um recibo por destinatário e atualiza os contadores na mesma transação.
+
+    Com ignore_conflicts (jobs com dedup_key) só as notificações realmente inseridas recebem recibos.
+    """
+    if not notifications:
+        return 0
+    now = timezone.now()
+    with transaction.atomic():
+        if ignore_conflicts:
+            keys = {n.dedup_key for n in notifications if n.dedup_key}
+            existing = set(TaskNotification.objects.filter(dedup_key__in=keys).values_list('dedup_key', flat=True))
+            TaskNotification.objects.bulk_create(notifications, ignore_conflicts=True, batch_size=batch_size)
+            created = list(
+                TaskNotification.objects.filter(dedup_key__in=keys - existing).values_list('id', 'team_id')
+            )
+        else:
+            created = [(n.id, n.team_id) for n in TaskNotification.objects.bulk_create(notifications, batch_size=batch_size)]
+
+        recipients = _recipients({team_id for _, team_id in created})
+        receipts = [
+            NotificationReceipt(notification_id=notification_id, user_id=user_id, created_at=now)
+            for notification_id, team_id in created
+            for user_id in recipients.get(team_id, ())
+        ]
+        # Notificações recém-criadas: nenhum recibo conflita, então cada um é +1 para o usuário.
+        NotificationReceipt.objects.bulk_create(receipts, batch_size=batch_size)
+        deltas = {}
+        for r in receipts:
+            deltas[r.user_id] = deltas.get(r.user_id, 0) + 1
+        _apply_deltas(deltas)
+        _publish(deltas)
+    return len(created)
+
+
+def notify(task, event_type, message):
+    return create_notifications([
+        TaskNotification(
+            task=task,
+            team_id=task.team_id,
+            event_type=event_type,
+            message=message,
+            created_at=timezone.now(),
+            read=False,
+        )
+    ])
+
+
+def mark_read(user_id, notification_id=None):
+    with transaction.atomic():
+        qs = NotificationReceipt.objects.filter(user_id=user_id, read_at__isnull=True)
+        if notification_id:
+            qs = qs.filter(notification_id=notification_id)
+        changed = qs.update(read_at=timezone.now())
+        if changed:
+            _apply_deltas({user_id: -changed})
+            _publish([user_id])
+    return changed
+
+
+def unread_count(user_id):
+    """Leitura por chave primária do contador mantido."""
+    return UserNotificationCounter.objects.filter(user_id=user_id).values_list('unread', flat=True).first() or 0
+
+
+def unread_receipts(user_id):
+    return NotificationReceipt.objects.filter(notification_id=models.OuterRef('pk'), user_id=user_id, read_at__isnull=True)
+
+
+# ===== Listagem (paginação por cursor em (created_at, id)) =====
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def notification_cursor(n):
+    return f'{(n.created_at - _EPOCH) // timedelta(microseconds=1)}:{n.id}'
+
+
+def parse_cursor(value):
+    """'<microssegundos desde epoch>:<id>' -> (datetime, id). Levanta ValueError se inválido."""
+    try:
+        us, nid = (int(v) for v in value.split(':', 1))
+        ts = _EPOCH + timedelta(microseconds=us)
+    except (ValueError, OverflowError):
+        raise ValueError(f'cursor inválido: {value!r}')
+    # id fora do bigint estouraria no banco.
+    if not 0 <= nid < 2 ** 63:
+        raise ValueError(f'cursor inválido: {value!r}')
+    return ts, nid
+
+
+def visible_notifications(allowed_team_ids):
+    qs = TaskNotification.objects.all()
+    if allowed_team_ids is not None:
+        qs = qs.filter(models.Q(team_id__in=allowed_team_ids) | models.Q(team__isnull=True))
+    return qs
+
+
+def page_notifications(qs, user_id, before=None, after=None, unread_only=False, limit=20):
+    """Uma página de notificações a partir de um cursor; custo constante em qualquer profundidade.
+
+    `before` traz as mais antigas que o cursor, `after` as mais recentes. Retorna
+    (itens do mais novo para o mais antigo, cursor_mais_recentes, cursor_mais_antigas).
+    """
+    qs = qs.annotate(unread=models.Exists(unread_receipts(user_id)))
+    if unread_only:
+        qs = qs.filter(unread=True)
+
+    if after:
+        ts, nid = parse_cursor(after)
+        qs = qs.filter(models.Q(created_at__gt=ts) | models.Q(created_at=ts, id__gt=nid)).order_by('created_at', 'id')
+    else:
+        if before:
+            ts, nid = parse_cursor(before)
+            qs = qs.filter(models.Q(created_at__lt=ts) | models.Q(created_at=ts, id__lt=nid))
+        qs = qs.order_by('-created_at', '-id')
+
+    items = list(qs[:limit + 1])
+    has_more = len(items) > limit
+    items = items[:limit]
+    if after:
+        items.reverse()
+    if not items:
+        return items, None, None
+
+    newer = notification_cursor(items[0]) if (before or (after and has_more)) else None
+    older = notification_cursor(items[-1]) if (after or has_more) else None
+    return items, newer, older
+
+
+def archive_notifications(before, batch_size=1000, keep_archive=True):
+    """Move (ou apaga) em lotes as notificações criadas antes de `before`.
+
+    Cada lote é uma transação curta: copia para o arquivo, remove recibos e notificações
+    e recalcula os contadores de quem tinha recibos pendentes. Retorna o total movido.
+    """
+    total = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                TaskNotification.objects.filter(created_at__lt=before)
+                .order_by('created_at', 'id')
+                .values('id', 'task_id', 'team_id', 'event_type', 'message', 'created_at', 'dedup_key')[:batch_size]
+            )
+            if not rows:
+                break
+            ids = [r['id'] for r in rows]
+            if keep_archive:
+                now = timezone.now()
+                TaskNotificationArchive.objects.bulk_create(
+                    [TaskNotificationArchive(archived_at=now, **r) for r in rows],
+                    ignore_conflicts=True,
+                )
+            deltas = {
+                user_id: -n
+                for user_id, n in NotificationReceipt.objects.filter(notification_id__in=ids, read_at__isnull=True)
+                .values('user_id')
+                .annotate(n=models.Count('id'))
+                .order_by()
+                .values_list('user_id', 'n')
+            }
+            # Os recibos saem junto (CASCADE, apagados num único DELETE pelo ORM).
+            TaskNotification.objects.filter(id__in=ids).delete()
+            _apply_deltas(deltas)
+            _publish(deltas)
+        total += len(rows)
+    return total
+
+
+def purge_archive(before, batch_size=5000):
+    total = 0
+    while True:
+        ids = list(TaskNotificationArchive.objects.filter(created_at__lt=before).order_by('created_at').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return total
+        total += TaskNotificationArchive.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,83 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import TaskAssignee, TeamMember
+
+MANAGER_ROLES = ('gerente', 'admin_workspace')
+MEMBER_ROLES = ('gerente', 'admin_workspace', 'colaborador')
+
+
+def _memberships_key(user_id):
+    return f'crm:memberships:{user_id}'
+
+
+def load_memberships(user_id):
+    """Mapa team_id -> role do usuário, com cache curto compartilhado entre workers."""
+    key = _memberships_key(user_id)
+    roles = cache.get(key)
+    if roles is None:
+        roles = {}
+        # Mesma regra de antes: havendo duplicidade, vale o vínculo mais recente.
+        for team_id, role in TeamMember.objects.filter(user_id=user_id).order_by('created_at', 'id').values_list('team_id', 'role'):
+            roles[team_id] = role
+        cache.set(key, roles, getattr(settings, 'CRM_PERMISSION_CACHE_TTL', 60))
+    return roles
+
+
+def invalidate_memberships(user_ids):
+    keys = [_memberships_key(uid) for uid in user_ids if uid]
+    if keys:
+        cache.delete_many(keys)
+
+
+class PermissionContext:
+    """Permissões do usuário da requisição; os vínculos são carregados uma única vez."""
+
+    def __init__(self, user):
+        self.user = user
+        self._roles = None
+
+    @property
+    def roles(self):
+        if self._roles is None:
+            self._roles = {} if self.user.is_admin else load_memberships(self.user.id)
+        return self._roles
+
+    def allowed_team_ids(self):
+        if self.user.is_admin:
+            return None
+        return list(self.roles.keys())
+
+    def can_see_team(self, team_id):
+        return self.user.is_admin or team_id in self.roles
+
+    def team_role(self, team_id):
+        if self.user.is_admin:
+            return 'admin'
+        return self.roles.get(team_id)
+
+    def can_manage_task(self, task):
+        if self.user.is_admin:
+            return True
+        return self.team_role(task.team_id) in MANAGER_ROLES
+
+    def is_assignee(self, task):
+        return TaskAssignee.objects.filter(task_id=task.id, user_id=self.user.id).exists()
+
+    def can_interact_task(self, task):
+        if self.user.is_admin:
+            return True
+        role = self.team_role(task.team_id)
+        if role in MEMBER_ROLES:
+            if role == 'colaborador':
+                return self.is_assignee(task)
+            return True
+        return False
+
+
+def get_permissions(request):
+    perms = getattr(request, '_crm_permissions', None)
+    if perms is None:
+        perms = PermissionContext(request.user_ctx['user'])
+        request._crm_permissions = perms
+    return perms
@@ -0,0 +1,167 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from . import events
+from .assignees import copy_assignees_many
+from .cache import bump_version
+from .models import TaskComment, TaskDemand, TaskRecurrenceRule
+from .search import refresh_task_search
+
+VERSION_NAME = 'recurrences'
+
+
+def next_run(base_dt, frequency, interval):
+    interval = max(int(interval or 1), 1)
+    if frequency == 'daily':
+        return base_dt + timezone.timedelta(days=interval)
+    if frequency == 'weekly':
+        return base_dt + timezone.timedelta(weeks=interval)
+    # monthly (aproximação operacional: +30 dias * intervalo)
+    return base_dt + timezone.timedelta(days=30 * interval)
+
+
+def _advance(rule, now, catch_up):
+    """Próximo next_run_at da regra após executar agora.
+
+    Sem catch_up o relógio recomeça de `now` (execuções perdidas viram uma só). Com catch_up
+    a regra avança a partir do horário previsto e continua vencida até repor no máximo
+    `catch_up` execuções perdidas; o excedente é pulado.
+    """
+    if not catch_up:
+        return next_run(now, rule.frequency, rule.interval)
+    nxt = next_run(rule.next_run_at, rule.frequency, rule.interval)
+    if nxt <= now:
+        step = nxt - rule.next_run_at
+        pending = (now - nxt) // step + 1
+        if pending > catch_up - 1:
+            nxt += step * (pending - (catch_up - 1))
+    return nxt
+
+
+def rules_changed():
+    """Avisa o agendador residente (run_recurrence_scheduler) que regras foram criadas ou alteradas."""
+    bump_version(VERSION_NAME)
+    events.publish('recurrences')
+
+
+def due_rules(now):
+    return TaskRecurrenceRule.objects.filter(active=True, next_run_at__lte=now)
+
+
+def upcoming_runs():
+    """(next_run_at, id) de todas as regras ativas (usa task_recur_due_idx)."""
+    return list(TaskRecurrenceRule.objects.filter(active=True).order_by('next_run_at', 'id').values_list('next_run_at', 'id'))
+
+
+def run_batch(batch_size=100, actor='recurrence-cron', now=None, catch_up=0):
+    """Trava um lote de regras vencidas (SKIP LOCKED) e cria as tarefas do lote de uma vez.
+
+    Regras travadas por outro processo são puladas, então várias execuções simultâneas
+    (cron em dois nós, "executar agora" durante o cron) nunca duplicam tarefas.
+    Retorna ([(novo next_run_at, id) das regras executadas], tarefas criadas).
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        rules = list(
+            due_rules(now)
+            .select_for_update(skip_locked=True, of=('self',))
+            .select_related('source_task')
+            .order_by('next_run_at', 'id')[:batch_size]
+        )
+        if not rules:
+            return [], 0
+
+        stage_ids = {r.source_task.stage_id for r in rules}
+        next_pos = {
+            row['stage_id']: (row['last'] or 0) + 1
+            for row in TaskDemand.objects.filter(stage_id__in=stage_ids).values('stage_id').annotate(last=models.Max('position')).order_by()
+        }
+
+        new_tasks = []
+        for r in rules:
+            src = r.source_task
+            pos = next_pos.get(src.stage_id, 1)
+            next_pos[src.stage_id] = pos + 1
+            new_tasks.append(TaskDemand(
+                title=src.title,
+                client_id=src.client_id,
+                description=src.description,
+                stage_id=src.stage_id,
+                workspace_id=src.workspace_id,
+                team_id=src.team_id,
+                work_group_id=None,
+                assigned_to=src.assigned_to,
+                due_date=src.due_date,
+                priority=src.priority,
+                created_by=actor,
+                created_at=now,
+                updated_at=now,
+                position=pos,
+            ))
+        TaskDemand.objects.bulk_create(new_tasks)
+
+        TaskComment.objects.bulk_create([
+            TaskComment(
+                task=task,
+                comment=f"[AUTO-RECORRÊNCIA] Criada a partir da regra '{r.name}'.",
+                author=actor,
+                created_at=now,
+            )
+            for r, task in zip(rules, new_tasks)
+        ])
+        by_source = {}
+        for r, task in zip(rules, new_tasks):
+            by_source.setdefault(r.source_task_id, []).append(task)
+        copy_assignees_many(by_source)
+        refresh_task_search([t.id for t in new_tasks])
+
+        for r in rules:
+            r.last_run_at = now
+            r.next_run_at = _advance(r, now, catch_up)
+        TaskRecurrenceRule.objects.bulk_update(rules, ['last_run_at', 'next_run_at'])
+    return [(r.next_run_at, r.id) for r in rules], len(new_tasks)
+
+
+def run_due_recurrences(batch_size=100, workers=1, actor='recurrence-cron', catch_up=0):
+    """Executa todas as regras vencidas com `workers` threads em paralelo e devolve um relatório.
+
+    `advanced` mapeia o id de cada regra executada para o seu novo next_run_at.
+    """
+    started = time.monotonic()
+    totals = {'rules': 0, 'tasks': 0, 'batches': 0, 'advanced': {}}
+    lock = threading.Lock()
+
+    def worker():
+        try:
+            while True:
+                advanced, tasks = run_batch(batch_size=batch_size, actor=actor, catch_up=catch_up)
+                if not advanced:
+                    return
+                with lock:
+                    totals['rules'] += len(advanced)
+                    totals['tasks'] += tasks
+                    totals['batches'] += 1
+                    # Com catch_up a mesma regra pode voltar em outro lote; vale o horário mais adiante.
+                    for next_run_at, rule_id in advanced:
+                        prev = totals['advanced'].get(rule_id)
+                        if prev is None or next_run_at > prev:
+                            totals['advanced'][rule_id] = next_run_at
+        finally:
+            if workers > 1:
+                connection.close()
+
+    if workers <= 1:
+        worker()
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for f in [pool.submit(worker) for _ in range(workers)]:
+                f.result()
+
+    elapsed = time.monotonic() - started
+    totals['elapsed'] = elapsed
+    totals['rules_per_second'] = totals['rules'] / elapsed if elapsed > 0 else 0.0
+    return totals
@@ -0,0 +1,182 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import models
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .models import Client, ClientContact, ClientSearchIndex, TaskComment, TaskDemand, TaskSearchDocument
+
+SEARCH_CONFIG = 'portuguese'
+# Comentários gerados por automações/recorrências não entram no documento.
+AUTO_COMMENT_PREFIX = '[AUTO'
+
+
+def _digits(value):
+    return re.sub(r'\D', '', value or '')
+
+
+def _plain(html):
+    return ' '.join(strip_tags(html or '').split())
+
+
+def refresh_task_search(task_ids):
+    """(Re)gera o documento de busca das tarefas informadas."""
+    task_ids = list(task_ids)
+    if not task_ids:
+        return 0
+
+    tasks = list(TaskDemand.objects.filter(id__in=task_ids).values('id', 'title', 'description', 'client_id'))
+    client_names = dict(Client.objects.filter(id__in={t['client_id'] for t in tasks}).values_list('id', 'name'))
+    comments = {}
+    for task_id, comment in (
+        TaskComment.objects.filter(task_id__in=task_ids)
+        .exclude(comment__startswith=AUTO_COMMENT_PREFIX)
+        .order_by('created_at')
+        .values_list('task_id', 'comment')
+    ):
+        comments.setdefault(task_id, []).append(_plain(comment))
+
+    now = timezone.now()
+    docs = [
+        TaskSearchDocument(
+            task_id=t['id'],
+            title=t['title'] or '',
+            client_name=client_names.get(t['client_id']) or '',
+            description=_plain(t['description']),
+            comments='\n'.join(comments.get(t['id'], [])),
+            updated_at=now,
+        )
+        for t in tasks
+    ]
+    TaskSearchDocument.objects.bulk_create(
+        docs,
+        update_conflicts=True,
+        unique_fields=['task'],
+        update_fields=['title', 'client_name', 'description', 'comments', 'updated_at'],
+    )
+    TaskSearchDocument.objects.filter(task_id__in=[t['id'] for t in tasks]).update(
+        document=(
+            SearchVector('title', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('client_name', weight='B', config=SEARCH_CONFIG)
+            + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+            + SearchVector('comments', weight='D', config=SEARCH_CONFIG)
+        )
+    )
+    return len(docs)
+
+
+def refresh_client_tasks_search(client_id):
+    refresh_task_search(TaskDemand.objects.filter(client_id=client_id).values_list('id', flat=True))
+
+
+def _match(q, prefix=''):
+    # title__icontains mantém os acertos por trecho de palavra ou código que o full-text e a
+    # similaridade não encontram. Vira UPPER(title) LIKE UPPER(q): servido pelo índice
+    # trigram em UPPER(title) (task_search_title_upper_trgm), não pelo de title.
+    query = SearchQuery(q, config=SEARCH_CONFIG, search_type='websearch')
+    cond = (
+        models.Q(**{f'{prefix}document': query})
+        | models.Q(**{f'{prefix}title__trigram_similar': q})
+        | models.Q(**{f'{prefix}title__icontains': q})
+    )
+    return query, cond
+
+
+def filter_tasks(tasks, q):
+    """Aplica a busca textual a um queryset de TaskDemand (usa os índices GIN)."""
+    _, cond = _match(q, prefix='search_document__')
+    return tasks.filter(cond)
+
+
+def search_tasks(q, allowed_team_ids=None, limit=20):
+    query, cond = _match(q)
+    qs = TaskSearchDocument.objects.filter(cond)
+    if allowed_team_ids is not None:
+        qs = qs.filter(task__team_id__in=allowed_team_ids)
+    return (
+        qs.annotate(
+            rank=SearchRank(models.F('document'), query),
+            similarity=TrigramSimilarity('title', q),
+        )
+        .select_related('task')
+        .defer('document', 'description', 'comments')
+        .order_by('-rank', '-similarity', '-task_id')[:limit]
+    )
+
+
+# ===== Clientes =====
+def refresh_client_search(client_ids):
+    """(Re)gera a linha de busca dos clientes informados (nome, CNPJ e contatos).
+
+    No Postgres os gatilhos da migração 0023 já fazem isso a cada escrita em clients e
+    client_contacts (inclusive as feitas fora do CRM); a chamada explícita é redundante lá,
+    mas atende os demais bancos e o rebuild_client_search.
+    """
+    client_ids = list(client_ids)
+    if not client_ids:
+        return 0
+
+    clients = list(Client.objects.filter(id__in=client_ids).values_list('id', 'name', 'cnpj'))
+    emails, phones = {}, {}
+    for client_id, email, phone in ClientContact.objects.filter(client_id__in=client_ids).values_list('client_id', 'email', 'phone'):
+        if email:
+            emails.setdefault(client_id, []).append(email.strip().lower())
+        if _digits(phone):
+            phones.setdefault(client_id, []).append(_digits(phone))
+
+    now = timezone.now()
+    rows = [
+        ClientSearchIndex(
+            client_id=cid,
+            name=(name or '').strip().lower(),
+            cnpj_digits=_digits(cnpj),
+            contact_emails=' '.join(emails.get(cid, [])),
+            contact_phones=' '.join(phones.get(cid, [])),
+            updated_at=now,
+        )
+        for cid, name, cnpj in clients
+    ]
+    ClientSearchIndex.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['client_id'],
+        update_fields=['name', 'cnpj_digits', 'contact_emails', 'contact_phones', 'updated_at'],
+    )
+    found = {cid for cid, _, _ in clients}
+    ClientSearchIndex.objects.filter(client_id__in=[cid for cid in client_ids if cid not in found]).delete()
+    return len(rows)
+
+
+def search_clients(q):
+    """IDs de clientes (queryset de ClientSearchIndex) ordenados por relevância para `q`."""
+    term = q.strip().lower()
+    digits = _digits(q)
+    cond = models.Q(name__contains=term) | models.Q(name__trigram_similar=term)
+    score = TrigramSimilarity('name', term)
+    if len(digits) >= 3:
+        cond |= models.Q(cnpj_digits__startswith=digits) | models.Q(contact_phones__contains=digits)
+        score = score + models.Case(
+            models.When(cnpj_digits=digits, then=models.Value(3.0)),
+            models.When(cnpj_digits__startswith=digits, then=models.Value(2.0)),
+            models.When(contact_phones__contains=digits, then=models.Value(1.0)),
+            default=models.Value(0.0),
+            output_field=models.FloatField(),
+        )
+    if '@' in term or len(term) >= 3:
+        cond |= models.Q(contact_emails__contains=term)
+        score = score + models.Case(
+            models.When(contact_emails__contains=term, then=models.Value(1.0)),
+            default=models.Value(0.0),
+            output_field=models.FloatField(),
+        )
+    return (
+        ClientSearchIndex.objects.filter(cond)
+        .annotate(score=score)
+        .order_by('-score', 'name', 'client_id')
+    )
+
+
+def clients_in_order(client_ids):
+    by_id = {c.id: c for c in Client.objects.filter(id__in=client_ids)}
+    return [by_id[cid] for cid in client_ids if cid in by_id]
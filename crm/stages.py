@@ -0,0 +1,59 @@
+import threading
+import time
+
+from .cache import bump_version, get_version
+from .models import TaskStage
+
+VERSION_NAME = 'stages'
+# Além do carimbo, o registro é recarregado periodicamente (mudanças feitas fora das telas).
+MAX_AGE = 300
+
+_lock = threading.Lock()
+_snapshot = None
+_snapshot_version = None
+_loaded_at = 0.0
+
+
+class _Snapshot:
+    def __init__(self, stages):
+        self.all = stages
+        self.active = [s for s in stages if s.active]
+        self.by_id = {s.id: s for s in stages}
+
+
+def _current():
+    global _snapshot, _snapshot_version, _loaded_at
+    version = get_version(VERSION_NAME)
+    if _snapshot is not None and _snapshot_version == version and time.monotonic() - _loaded_at < MAX_AGE:
+        return _snapshot
+    with _lock:
+        if _snapshot is None or _snapshot_version != version or time.monotonic() - _loaded_at >= MAX_AGE:
+            _snapshot = _Snapshot(list(TaskStage.objects.all().order_by('sort_order', 'name')))
+            _snapshot_version = version
+            _loaded_at = time.monotonic()
+        return _snapshot
+
+
+def all_stages():
+    """Todos os estágios, na ordem do kanban. As instâncias são compartilhadas: não alterar."""
+    return _current().all
+
+
+def active_stages():
+    return _current().active
+
+
+def get_stage(stage_id):
+    try:
+        return _current().by_id.get(int(stage_id))
+    except (TypeError, ValueError):
+        return None
+
+
+def stage_name(stage_id, default='—'):
+    stage = get_stage(stage_id)
+    return stage.name if stage else default
+
+
+def invalidate():
+    bump_version(VERSION_NAME)
@@ -0,0 +1,30 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.test import SimpleTestCase
+
+from .notifications import _EPOCH, parse_cursor
+
+
+class ParseCursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        ts, nid = parse_cursor('1700000000123456:42')
+        self.assertEqual(ts, datetime(2023, 11, 14, 22, 13, 20, 123456, tzinfo=dt_timezone.utc))
+        self.assertEqual(nid, 42)
+
+    def test_epoch(self):
+        self.assertEqual(parse_cursor('0:1'), (_EPOCH, 1))
+
+    def test_malformed_is_invalid(self):
+        for value in ('', 'abc', '123', '1:x', ':'):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                parse_cursor(value)
+
+    def test_oversized_timestamp_is_invalid(self):
+        # timedelta/datetime estouram com OverflowError; o chamador só trata ValueError.
+        for value in ('99999999999999999999:1', '-99999999999999999999:1', '9' * 400 + ':1'):
+            with self.subTest(value=value[:30]), self.assertRaises(ValueError):
+                parse_cursor(value)
+
+    def test_oversized_id_is_invalid(self):
+        with self.assertRaises(ValueError):
+            parse_cursor('0:99999999999999999999')
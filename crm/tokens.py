@@ -0,0 +1,129 @@
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core import signing
+from django.utils import timezone
+
+from .assignees import ensure_user_assignees
+from .auth import user_stamp
+from .cache import TTLCache
+from .models import ApiTokenRevocation, User
+
+# Tokens assinados (HMAC com SECRET_KEY) para a API: validados em memória,
+# sem consulta à tabela sessions. O prefixo os diferencia dos tokens de sessão.
+TOKEN_PREFIX = 'crmt1.'
+_SALT = 'crm.api-token'
+# SECRET_KEY padrão de config/settings.py: com ela qualquer um assina tokens válidos.
+_DEV_SECRET_KEY = 'dev-secret'
+
+_revoked = set()
+_revoked_loaded_at = 0.0
+_revoked_lock = threading.Lock()
+
+# Estado atual do usuário (ativo/admin): o token não basta, desativação e rebaixamento valem
+# na hora via carimbo do usuário e, para mudanças fora do CRM, após CRM_API_USER_CACHE_TTL.
+_users = TTLCache(
+    maxsize=getattr(settings, 'CRM_SESSION_CACHE_SIZE', 2048),
+    ttl=getattr(settings, 'CRM_API_USER_CACHE_TTL', 30),
+)
+
+
+def is_api_token(token):
+    return bool(token) and token.startswith(TOKEN_PREFIX)
+
+
+def signing_enabled():
+    """Tokens assinados só valem com uma SECRET_KEY real (ou em DEBUG)."""
+    return settings.DEBUG or settings.SECRET_KEY != _DEV_SECRET_KEY
+
+
+def issue_api_token(user, ttl_hours=None):
+    if not signing_enabled():
+        raise ImproperlyConfigured('Defina SECRET_KEY para emitir tokens de API.')
+    max_hours = getattr(settings, 'CRM_API_TOKEN_MAX_TTL_HOURS', 720)
+    ttl_hours = ttl_hours or getattr(settings, 'CRM_API_TOKEN_TTL_HOURS', 24)
+    ttl_hours = max(1, min(int(ttl_hours), max_hours))
+    expires_at = timezone.now() + timedelta(hours=ttl_hours)
+    claims = {
+        'jti': uuid.uuid4().hex,
+        'uid': str(user.id),
+        'adm': bool(user.is_admin),
+        'em': user.email,
+        'nm': user.name,
+        'exp': int(expires_at.timestamp()),
+    }
+    token = TOKEN_PREFIX + signing.dumps(claims, salt=_SALT, compress=True)
+    return token, expires_at, claims['jti']
+
+
+def _load_claims(token):
+    if not is_api_token(token) or not signing_enabled():
+        return None
+    try:
+        claims = signing.loads(token[len(TOKEN_PREFIX):], salt=_SALT)
+    except signing.BadSignature:
+        return None
+    if not isinstance(claims, dict) or int(claims.get('exp') or 0) <= time.time():
+        return None
+    return claims
+
+
+def _revoked_jtis():
+    global _revoked, _revoked_loaded_at
+    ttl = getattr(settings, 'CRM_API_TOKEN_REVOCATION_TTL', 30)
+    if time.monotonic() - _revoked_loaded_at < ttl:
+        return _revoked
+    with _revoked_lock:
+        if time.monotonic() - _revoked_loaded_at >= ttl:
+            _revoked = set(ApiTokenRevocation.objects.filter(expires_at__gt=timezone.now()).values_list('jti', flat=True))
+            _revoked_loaded_at = time.monotonic()
+    return _revoked
+
+
+def _current_user(user_id):
+    """O usuário ativo com esse id (do banco, com cache curto) ou None."""
+    stamp = user_stamp(user_id)
+    item = _users.get(user_id)
+    if item is not None and item[0] == stamp:
+        return item[1]
+    user = User.objects.filter(id=user_id, active=True).only('id', 'email', 'name', 'is_admin', 'active').first()
+    if user is not None:
+        ensure_user_assignees(user)
+    _users.set(user_id, (stamp, user))
+    return user
+
+
+def verify_api_token(token):
+    """Retorna um user_ctx {session: None, user, token} ou None."""
+    claims = _load_claims(token)
+    if not claims or claims.get('jti') in _revoked_jtis():
+        return None
+    try:
+        user_id = uuid.UUID(claims['uid'])
+    except (KeyError, ValueError):
+        return None
+    user = _current_user(user_id)
+    if user is None:
+        return None
+    return {'session': None, 'user': user, 'token': claims}
+
+
+def revoke_api_token(token):
+    claims = _load_claims(token)
+    if not claims:
+        return None
+    ApiTokenRevocation.objects.get_or_create(
+        jti=claims['jti'],
+        defaults={
+            'user_id': claims.get('uid'),
+            'expires_at': datetime.fromtimestamp(claims['exp'], tz=dt_timezone.utc),
+            'created_at': timezone.now(),
+        },
+    )
+    with _revoked_lock:
+        _revoked.add(claims['jti'])
+    return claims
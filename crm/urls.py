@@ -5,10 +5,14 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
+    path('logout/all/', views.logout_all_view, name='logout_all'),
 
     # API (mesmo banco do app, via ORM Django)
     path('api/health/', api.api_health, name='api_health'),
     path('api/me/', api.api_me, name='api_me'),
+    path('api/cache-stats/', api.api_cache_stats, name='api_cache_stats'),
+    path('api/tokens/', api.api_tokens, name='api_tokens'),
+    path('api/tokens/revoke/', api.api_token_revoke, name='api_token_revoke'),
     path('api/clients/', api.api_clients, name='api_clients'),
     path('api/clients/<str:client_id>/', api.api_client_detail, name='api_client_detail'),
     path('api/clients/<str:client_id>/contacts/', api.api_client_contacts, name='api_client_contacts'),
@@ -17,6 +21,8 @@ urlpatterns = [
     path('api/credentials/<str:credential_id>/', api.api_credential_detail, name='api_credential_detail'),
     path('api/clients/<str:client_id>/links/', api.api_client_links, name='api_client_links'),
     path('api/links/<str:link_id>/', api.api_link_detail, name='api_link_detail'),
+    path('api/tasks/mine/', api.api_my_tasks, name='api_my_tasks'),
+    path('api/notifications/', api.api_notifications, name='api_notifications'),
 
     path('export.xlsx', views.export_xlsx, name='export_xlsx'),
 
@@ -37,11 +43,15 @@ urlpatterns = [
 
     # Tarefas
     path('tasks/', views.tasks_dashboard, name='tasks_dashboard'),
+    path('tasks/search/', views.task_search, name='task_search'),
+    path('tasks/stages/<int:stage_id>/cards/', views.task_stage_cards, name='task_stage_cards'),
     path('tasks/notifications/unread-count/', views.notifications_unread_count, name='notifications_unread_count'),
+    path('tasks/notifications/stream/', views.notifications_stream, name='notifications_stream'),
     path('tasks/notifications/', views.notifications_list, name='notifications_list'),
     path('tasks/notifications/read/', views.notifications_mark_read, name='notifications_mark_read_all'),
     path('tasks/notifications/read/<int:notification_id>/', views.notifications_mark_read, name='notifications_mark_read'),
     path('tasks/workload/', views.workload_dashboard, name='workload_dashboard'),
+    path('tasks/workload/trend/', views.workload_trend, name='workload_trend'),
     path('tasks/settings/', views.tasks_settings, name='tasks_settings'),
     path('teams/settings/', views.teams_settings, name='teams_settings'),
     path('tasks/settings/stages/<int:stage_id>/delete/', views.task_stage_delete, name='task_stage_delete'),
@@ -1,178 +1,78 @@
+import json
+import time
 import uuid
 from io import BytesIO
 from PIL import Image
 from django.core.files.base import ContentFile
+from django.conf import settings
 
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
+from django.template.loader import render_to_string
 from django.views.decorators.http import require_http_methods
 from django.core.paginator import Paginator
 from django.utils import timezone
-from django.db import models
+from django.db import connection, models
+from django.db.models.functions import RowNumber
 from django.core.files.storage import default_storage
 
 from openpyxl import Workbook
 
-from .auth import authenticate, create_session, destroy_session
+from . import events
+from .assignees import sync_task_assignees
+from .automations import invalidate as invalidate_automations, matching_rules
+from .auth import LoginBusy, LoginThrottled, authenticate, create_session, destroy_session, destroy_user_sessions
+from .notifications import mark_read, notify, page_notifications, unread_count, visible_notifications
+from .permissions import get_permissions, invalidate_memberships
+from .recurrence import next_run, rules_changed, run_due_recurrences
+from .search import (
+    clients_in_order, filter_tasks, refresh_client_search, refresh_client_tasks_search, refresh_task_search,
+    search_clients, search_tasks,
+)
+from .stages import active_stages, all_stages, get_stage, invalidate as invalidate_stages, stage_name
+from .writes import buffered_writes
 from .models import (
     Client, ClientContact, ClientCredentialSimple, ClientLink,
     User,
-    TaskStage, WorkGroup, TaskDemand, TaskComment, TaskAttachment, TaskAutomation, TaskRecurrenceRule, TaskNotification,
-    Workspace, Team, TeamMember,
+    TaskStage, WorkGroup, TaskDemand, TaskAttachment, TaskAutomation, TaskRecurrenceRule,
+    Workspace, Team, TeamMember, WorkloadSnapshot,
 )
 
 
+KANBAN_PAGE_SIZE = 20
+NOTIFICATIONS_PAGE_SIZE = 20
+
+
 def require_login(request):
     if not getattr(request, 'user_ctx', None):
         return redirect('/login/?next=' + request.path)
     return None
 
 
-def _allowed_team_ids(user):
-    if user.is_admin:
-        return None
-    return list(TeamMember.objects.filter(user_id=user.id).values_list('team_id', flat=True))
-
-
-def _team_role(user, team_id):
-    if user.is_admin:
-        return 'admin'
-    m = TeamMember.objects.filter(user_id=user.id, team_id=team_id).first()
-    return m.role if m else None
-
-
-def _can_manage_task(user, task):
-    if user.is_admin:
-        return True
-    role = _team_role(user, task.team_id)
-    return role in ('gerente', 'admin_workspace')
-
-
-def _can_interact_task(user, task):
-    if user.is_admin:
-        return True
-    role = _team_role(user, task.team_id)
-    if role in ('gerente', 'admin_workspace', 'colaborador'):
-        if role == 'colaborador':
-            ass = (task.assigned_to or '').lower()
-            return (user.email or '').lower() in ass or (user.name or '').lower() in ass
-        return True
-    return False
-
-
-def _notify(task, event_type, message):
-    TaskNotification.objects.create(
-        task=task,
-        team_id=task.team_id,
-        event_type=event_type,
-        message=message,
-        created_at=timezone.now(),
-        read=False,
-    )
-
-
-def _run_stage_automations(task, old_stage_id, new_stage_id, actor_email=None):
-    autos = TaskAutomation.objects.filter(active=True)
-    if task.workspace_id:
-        autos = autos.filter(models.Q(workspace_id=task.workspace_id) | models.Q(workspace__isnull=True))
-    if task.team_id:
-        autos = autos.filter(models.Q(team_id=task.team_id) | models.Q(team__isnull=True))
-
-    for a in autos:
-        if a.trigger_from_stage_id and a.trigger_from_stage_id != old_stage_id:
-            continue
-        if a.trigger_to_stage_id and a.trigger_to_stage_id != new_stage_id:
-            continue
-
-        msg = (a.message_template or '').strip()
-        if not msg:
-            msg = f"Automação '{a.name}' executada na mudança de estágio."
-
-        msg = msg.replace('{{task_title}}', task.title or '')
-        msg = msg.replace('{{from_stage}}', str(old_stage_id or ''))
-        msg = msg.replace('{{to_stage}}', str(new_stage_id or ''))
-
-        # Nesta versão, ações viram registro no histórico de comentários.
-        prefix = '[AUTO]' if a.action == 'comment' else '[AUTO-NOTIFY]'
-        TaskComment.objects.create(
-            task=task,
-            comment=f"{prefix} {msg}",
-            author=actor_email or 'automation',
-            created_at=timezone.now(),
-        )
-
-
-def _next_run(base_dt, frequency, interval):
-    interval = max(int(interval or 1), 1)
-    if frequency == 'daily':
-        return base_dt + timezone.timedelta(days=interval)
-    if frequency == 'weekly':
-        return base_dt + timezone.timedelta(weeks=interval)
-    # monthly (aproximação operacional: +30 dias * intervalo)
-    return base_dt + timezone.timedelta(days=30 * interval)
-
-
-def _ensure_due_notifications(base_qs):
-    today = timezone.now().date()
-    tomorrow = today + timezone.timedelta(days=1)
-
-    due_soon = base_qs.filter(due_date=tomorrow)
-    for t in due_soon:
-        key = f"[DUE_SOON:{tomorrow.isoformat()}]"
-        if not TaskNotification.objects.filter(task=t, event_type='due_soon', message__contains=key).exists():
-            _notify(t, 'due_soon', f"{key} Tarefa '{t.title}' vence amanhã.")
-
-    overdue = base_qs.filter(due_date__lt=today).exclude(stage__name__icontains='done').exclude(stage__name__icontains='concl')
-    for t in overdue:
-        key = f"[OVERDUE:{today.isoformat()}]"
-        if not TaskNotification.objects.filter(task=t, event_type='overdue', message__contains=key).exists():
-            _notify(t, 'overdue', f"{key} Tarefa '{t.title}' está atrasada.")
-
-
-def _execute_due_recurrences(actor_email='system'):
-    now = timezone.now()
-    rules = TaskRecurrenceRule.objects.filter(active=True).filter(models.Q(next_run_at__lte=now) | models.Q(next_run_at__isnull=True))
-    for r in rules:
-        src = r.source_task
-        if not src:
-            continue
-
-        last_pos = TaskDemand.objects.filter(stage_id=src.stage_id).order_by('-position').first()
-        next_pos = (last_pos.position + 1) if last_pos else 1
-
-        new_task = TaskDemand.objects.create(
-            title=src.title,
-            client_id=src.client_id,
-            description=src.description,
-            stage_id=src.stage_id,
-            workspace_id=src.workspace_id,
-            team_id=src.team_id,
-            work_group_id=None,
-            assigned_to=src.assigned_to,
-            due_date=src.due_date,
-            priority=src.priority,
-            created_by=actor_email,
-            created_at=now,
-            updated_at=now,
-            position=next_pos,
-        )
-
-        TaskComment.objects.create(
-            task=new_task,
-            comment=f"[AUTO-RECORRÊNCIA] Criada a partir da regra '{r.name}'.",
-            author=actor_email,
-            created_at=now,
-        )
-
-        r.last_run_at = now
-        r.next_run_at = _next_run(now, r.frequency, r.interval)
-        r.save(update_fields=['last_run_at', 'next_run_at'])
+def _run_stage_automations(task, old_stage_id, new_stage_id, writes, actor_email=None):
+    # Regras compiladas em memória (crm.automations): casar é uma busca em dicionário.
+    run_async = getattr(settings, 'CRM_AUTOMATIONS_ASYNC', True)
+    for rule in matching_rules(task, old_stage_id, new_stage_id):
+        if run_async:
+            # Executada pelo run_automation_worker depois do commit.
+            writes.enqueue_automation(task, rule, old_stage_id, new_stage_id, actor=actor_email)
+        else:
+            # Nesta versão, ações viram registro no histórico de comentários.
+            writes.comment(task, rule.render(task, old_stage_id, new_stage_id), author=actor_email or 'automation')
 
 
 def home(request):
     return redirect('/clients/')
 
 
+def _client_ip(request):
+    # Atrás do proxy reverso, o último endereço do X-Forwarded-For é o adicionado por ele.
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+    if forwarded:
+        return forwarded.split(',')[-1].strip()
+    return request.META.get('REMOTE_ADDR')
+
+
 @require_http_methods(["GET", "POST"])
 def login_view(request):
     if request.method == 'GET':
@@ -182,7 +82,12 @@ def login_view(request):
     password = request.POST.get('password', '')
     nxt = request.POST.get('next', '/clients/')
 
-    u = authenticate(email, password)
+    try:
+        u = authenticate(email, password, ip=_client_ip(request))
+    except LoginThrottled:
+        return render(request, 'login.html', { 'next': nxt, 'error': 'Muitas tentativas. Aguarde alguns minutos e tente novamente.' }, status=429)
+    except LoginBusy:
+        return render(request, 'login.html', { 'next': nxt, 'error': 'Servidor ocupado. Tente novamente em instantes.' }, status=503)
     if not u:
         return render(request, 'login.html', { 'next': nxt, 'error': 'Credenciais inválidas' })
 
@@ -201,6 +106,16 @@ def logout_view(request):
     return resp
 
 
+@require_http_methods(["POST"])
+def logout_all_view(request):
+    """Encerra todas as sessões do usuário (todos os dispositivos)."""
+    if getattr(request, 'user_ctx', None):
+        destroy_user_sessions(request.user_ctx['user'].id)
+    resp = redirect('/login/')
+    resp.delete_cookie('crm_session', path='/')
+    return resp
+
+
 def clients_list(request):
     guard = require_login(request)
     if guard: return guard
@@ -208,12 +123,13 @@ def clients_list(request):
     q = (request.GET.get('q') or '').strip()
     page = int(request.GET.get('page') or '1')
 
-    qs = Client.objects.all().order_by('name')
     if q:
-        qs = qs.filter(name__icontains=q)
-
-    paginator = Paginator(qs, 25)
-    p = paginator.get_page(page)
+        paginator = Paginator(search_clients(q).values_list('client_id', flat=True), 25)
+        p = paginator.get_page(page)
+        p.object_list = clients_in_order(list(p.object_list))
+    else:
+        paginator = Paginator(Client.objects.all().order_by('name'), 25)
+        p = paginator.get_page(page)
 
     return render(request, 'clients.html', {
         'q': q,
@@ -264,6 +180,7 @@ def client_new(request):
         created_at=timezone.now(),
         updated_at=timezone.now(),
     )
+    refresh_client_search([cid])
     return redirect(f'/clients/{cid}/')
 
 
@@ -283,6 +200,7 @@ def client_edit(request, client_id):
     if not name:
         return render(request, 'client_form.html', { 'title': 'Editar cliente', 'client': c, 'error': 'Nome obrigatório' })
 
+    name_changed = c.name != name
     c.name = name
     c.cnpj = (request.POST.get('cnpj') or '').strip() or None
     c.status = (request.POST.get('status') or '').strip() or None
@@ -290,6 +208,9 @@ def client_edit(request, client_id):
     c.notes = (request.POST.get('notes') or '').strip() or None
     c.updated_at = timezone.now()
     c.save(update_fields=['name', 'cnpj', 'status', 'type', 'notes', 'updated_at'])
+    refresh_client_search([client_id])
+    if name_changed:
+        refresh_client_tasks_search(client_id)
 
     return redirect(f'/clients/{client_id}/')
 
@@ -303,6 +224,7 @@ def client_delete(request, client_id):
     ClientContact.objects.filter(client_id=client_id).delete()
     ClientCredentialSimple.objects.filter(client_id=client_id).delete()
     ClientLink.objects.filter(client_id=client_id).delete()
+    refresh_client_search([client_id])
     return redirect('/clients/')
 
 
@@ -323,6 +245,7 @@ def contact_new(request, client_id):
         notes=(request.POST.get('notes') or '').strip() or None,
         created_at=timezone.now(),
     )
+    refresh_client_search([client_id])
     return redirect(f'/clients/{client_id}/')
 
 
@@ -336,6 +259,7 @@ def contact_delete(request, contact_id):
         return redirect('/clients/')
     client_id = c.client_id
     ClientContact.objects.filter(id=contact_id).delete()
+    refresh_client_search([client_id])
     return redirect(f'/clients/{client_id}/')
 
 
@@ -443,33 +367,103 @@ def notifications_unread_count(request):
     if guard:
         return JsonResponse({'count': 0}, status=401)
 
-    user = request.user_ctx['user']
-    allowed_team_ids = _allowed_team_ids(user)
+    return JsonResponse({'count': unread_count(request.user_ctx['user'].id)})
+
+
+class _NotificationStream:
+    """Corpo SSE: envia a contagem de não lidas só quando ela muda.
+
+    O contador é relido apenas quando chega um evento que envolve o usuário;
+    entre eventos a conexão com o banco fica fechada e só trafegam heartbeats.
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.subscription = events.subscribe()
+        self.closed = False
+
+    def _relevant(self, payload):
+        if payload.get('kind') not in ('notifications', 'resync'):
+            return False
+        user_ids = payload.get('user_ids')
+        return user_ids is None or str(self.user_id) in user_ids
+
+    def __iter__(self):
+        heartbeat = getattr(settings, 'CRM_SSE_HEARTBEAT', 20)
+        deadline = time.monotonic() + getattr(settings, 'CRM_SSE_MAX_SECONDS', 300)
+        last = None
+        dirty = True
+        yield 'retry: 5000\n\n'
+        while not self.closed:
+            if dirty:
+                with events.db_slot():
+                    count = unread_count(self.user_id)
+                    connection.close()
+                if count != last:
+                    last = count
+                    yield f"event: count\ndata: {json.dumps({'count': count})}\n\n"
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            pending = self.subscription.wait(min(heartbeat, remaining))
+            dirty = any(self._relevant(p) for p in pending)
+            if not pending:
+                yield ': ping\n\n'
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            events.unsubscribe(self.subscription)
+            events.release_stream_slot()
+
+
+def notifications_stream(request):
+    guard = require_login(request)
+    if guard:
+        return JsonResponse({'error': 'unauthorized'}, status=401)
 
-    qs = TaskNotification.objects.all()
-    if allowed_team_ids is not None:
-        qs = qs.filter(models.Q(team_id__in=allowed_team_ids) | models.Q(team__isnull=True))
+    if not events.acquire_stream_slot():
+        # O navegador volta para o polling de /unread-count/.
+        return JsonResponse({'error': 'busy'}, status=503)
 
-    return JsonResponse({'count': qs.filter(read=False).count()})
+    try:
+        stream = _NotificationStream(request.user_ctx['user'].id)
+    except Exception:
+        events.release_stream_slot()
+        raise
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 def notifications_list(request):
     guard = require_login(request)
     if guard: return guard
 
-    user = request.user_ctx['user']
-    allowed_team_ids = _allowed_team_ids(user)
+    user_id = request.user_ctx['user'].id
+    allowed_team_ids = get_permissions(request).allowed_team_ids()
+    unread_only = request.GET.get('unread') == '1'
 
-    qs = TaskNotification.objects.select_related('task', 'team').all()
-    if allowed_team_ids is not None:
-        qs = qs.filter(models.Q(team_id__in=allowed_team_ids) | models.Q(team__isnull=True))
-
-    notifications = qs.order_by('-created_at')[:200]
-    unread_count = qs.filter(read=False).count()
+    # Lida/não lida é por usuário: sem recibo pendente, a notificação aparece como lida.
+    try:
+        notifications, newer, older = page_notifications(
+            visible_notifications(allowed_team_ids),
+            user_id,
+            before=(request.GET.get('before') or '').strip() or None,
+            after=(request.GET.get('after') or '').strip() or None,
+            unread_only=unread_only,
+            limit=NOTIFICATIONS_PAGE_SIZE,
+        )
+    except ValueError:
+        return redirect('/tasks/notifications/')
 
     return render(request, 'notifications.html', {
         'notifications': notifications,
-        'unread_count': unread_count,
+        'unread_count': unread_count(user_id),
+        'unread_only': unread_only,
+        'newer_cursor': newer,
+        'older_cursor': older,
     })
 
 
@@ -478,17 +472,7 @@ def notifications_mark_read(request, notification_id=None):
     guard = require_login(request)
     if guard: return guard
 
-    user = request.user_ctx['user']
-    allowed_team_ids = _allowed_team_ids(user)
-
-    qs = TaskNotification.objects.all()
-    if allowed_team_ids is not None:
-        qs = qs.filter(models.Q(team_id__in=allowed_team_ids) | models.Q(team__isnull=True))
-
-    if notification_id:
-        qs.filter(id=notification_id).update(read=True)
-    else:
-        qs.filter(read=False).update(read=True)
+    mark_read(request.user_ctx['user'].id, notification_id)
 
     return redirect('/tasks/notifications/')
 
@@ -497,8 +481,7 @@ def workload_dashboard(request):
     guard = require_login(request)
     if guard: return guard
 
-    user = request.user_ctx['user']
-    allowed_team_ids = _allowed_team_ids(user)
+    allowed_team_ids = get_permissions(request).allowed_team_ids()
 
     days = int((request.GET.get('days') or '30').strip() or '30')
     start_date = timezone.now().date() - timezone.timedelta(days=days)
@@ -507,24 +490,40 @@ def workload_dashboard(request):
     if allowed_team_ids is not None:
         teams = teams.filter(id__in=allowed_team_ids)
 
+    teams = list(teams)
+
+    def in_category(category):
+        return models.Count('id', filter=models.Q(stage__category=category))
+
+    # Uma única consulta agrupada por equipe, classificando pela categoria do estágio.
+    stats = {
+        r['team_id']: r
+        for r in TaskDemand.objects.filter(team_id__in=[tm.id for tm in teams], created_at__date__gte=start_date)
+        .values('team_id')
+        .annotate(
+            total=models.Count('id'),
+            done=in_category('done'),
+            em_producao=in_category('doing'),
+            fila=in_category('queue'),
+            overdue=models.Count('id', filter=models.Q(due_date__lt=timezone.now().date()) & ~models.Q(stage__category='done')),
+        )
+        .order_by()
+    }
+
     rows = []
     max_total = 1
+    empty = {'total': 0, 'fila': 0, 'em_producao': 0, 'done': 0, 'overdue': 0}
     for tm in teams:
-        qs = TaskDemand.objects.filter(team=tm, created_at__date__gte=start_date)
-        total = qs.count()
-        done = qs.filter(stage__name__icontains='concl').count() + qs.filter(stage__name__icontains='done').count()
-        em_producao = qs.filter(stage__name__icontains='produção').count() + qs.filter(stage__name__icontains='doing').count()
-        fila = qs.filter(stage__name__icontains='fila').count() + qs.filter(stage__name__icontains='todo').count()
-        overdue = qs.filter(due_date__lt=timezone.now().date()).exclude(stage__name__icontains='done').count()
-        max_total = max(max_total, total)
+        st = stats.get(tm.id, empty)
+        max_total = max(max_total, st['total'])
         rows.append({
             'workspace': tm.workspace.name,
             'team': tm.name,
-            'total': total,
-            'fila': fila,
-            'em_producao': em_producao,
-            'done': done,
-            'overdue': overdue,
+            'total': st['total'],
+            'fila': st['fila'],
+            'em_producao': st['em_producao'],
+            'done': st['done'],
+            'overdue': st['overdue'],
         })
 
     for r in rows:
@@ -533,68 +532,231 @@ def workload_dashboard(request):
     return render(request, 'workload_dashboard.html', {'rows': rows, 'days': days})
 
 
-def tasks_dashboard(request):
+def workload_trend(request):
+    """Série histórica por equipe, lida só das fotografias diárias (snapshot_workload)."""
     guard = require_login(request)
-    if guard: return guard
+    if guard:
+        return JsonResponse({'error': 'unauthorized'}, status=401)
 
-    user = request.user_ctx['user']
-    q = (request.GET.get('q') or '').strip()
-    stage_id = (request.GET.get('stage') or '').strip()
-    priority = (request.GET.get('priority') or '').strip()
-    workspace_id = (request.GET.get('workspace') or '').strip()
-    team_id = (request.GET.get('team') or '').strip()
+    allowed_team_ids = get_permissions(request).allowed_team_ids()
 
-    tasks = TaskDemand.objects.select_related('stage', 'workspace', 'team').all().order_by('stage_id', 'position', '-created_at')
-    allowed_team_ids = _allowed_team_ids(user)
+    try:
+        days = int((request.GET.get('days') or '180').strip() or '180')
+    except ValueError:
+        days = 180
+    days = max(1, min(days, 730))
+    end_date = timezone.now().date()
+    start_date = end_date - timezone.timedelta(days=days)
+
+    teams = Team.objects.select_related('workspace').order_by('workspace__name', 'name')
     if allowed_team_ids is not None:
-        tasks = tasks.filter(team_id__in=allowed_team_ids)
-    if q:
-        tasks = tasks.filter(title__icontains=q)
-    if stage_id:
-        tasks = tasks.filter(stage_id=stage_id)
-    if priority:
-        tasks = tasks.filter(priority=priority)
-    if workspace_id:
-        tasks = tasks.filter(workspace_id=workspace_id)
+        teams = teams.filter(id__in=allowed_team_ids)
+    team_id = (request.GET.get('team_id') or '').strip()
     if team_id:
-        tasks = tasks.filter(team_id=team_id)
+        teams = teams.filter(id=team_id) if team_id.isdigit() else teams.none()
+    teams = {tm.id: tm for tm in teams}
+
+    categories = [c for c, _ in TaskStage.CATEGORY_CHOICES]
+    points = {}
+    for snap in (
+        WorkloadSnapshot.objects.filter(team_id__in=list(teams), day__gte=start_date, day__lte=end_date)
+        .values('team_id', 'day', 'category', 'task_count', 'overdue_count', 'created_count')
+        .order_by('team_id', 'day')
+    ):
+        by_day = points.setdefault(snap['team_id'], {})
+        p = by_day.get(snap['day'])
+        if p is None:
+            p = {'day': snap['day'].isoformat(), 'overdue': 0, 'created': 0, **{c: 0 for c in categories}}
+            by_day[snap['day']] = p
+        p[snap['category']] = snap['task_count']
+        p['overdue'] += snap['overdue_count']
+        p['created'] += snap['created_count']
+
+    return JsonResponse({
+        'start': start_date.isoformat(),
+        'end': end_date.isoformat(),
+        'categories': categories,
+        'teams': [
+            {
+                'id': tm.id,
+                'workspace': tm.workspace.name,
+                'team': tm.name,
+                'points': list(points.get(tm.id, {}).values()),
+            }
+            for tm in teams.values()
+        ],
+    })
 
-    stages = TaskStage.objects.filter(active=True).order_by('sort_order', 'name')
-    stage_cards = []
-    for s in stages:
-        stage_cards.append({'id': s.id, 'name': s.name, 'count': tasks.filter(stage=s).count()})
 
-    client_map = {c.id: c.name for c in Client.objects.filter(id__in=[t.client_id for t in tasks])}
+def _stage_counts(tasks, stages):
+    """Contagem por estágio e total numa única consulta agregada (respeita os filtros de `tasks`)."""
+    aggregates = {'total': models.Count('id')}
+    for s in stages:
+        aggregates[f'stage_{s.id}'] = models.Count('id', filter=models.Q(stage_id=s.id))
+    counts = tasks.order_by().aggregate(**aggregates)
+    stage_cards = [{'id': s.id, 'name': s.name, 'count': counts[f'stage_{s.id}']} for s in stages]
+    return stage_cards, counts['total']
+
+
+def _task_filters(request):
+    return {
+        'q': (request.GET.get('q') or '').strip(),
+        'stage_id': (request.GET.get('stage') or '').strip(),
+        'priority': (request.GET.get('priority') or '').strip(),
+        'workspace_id': (request.GET.get('workspace') or '').strip(),
+        'team_id': (request.GET.get('team') or '').strip(),
+        'mine': (request.GET.get('mine') or '').strip() == '1',
+    }
+
+
+def _filtered_tasks(request, filters):
+    tasks = TaskDemand.objects.select_related('stage', 'workspace', 'team').all()
+    allowed_team_ids = get_permissions(request).allowed_team_ids()
+    if allowed_team_ids is not None:
+        tasks = tasks.filter(team_id__in=allowed_team_ids)
+    if filters['q']:
+        tasks = filter_tasks(tasks, filters['q'])
+    if filters['stage_id']:
+        tasks = tasks.filter(stage_id=filters['stage_id'])
+    if filters['priority']:
+        tasks = tasks.filter(priority=filters['priority'])
+    if filters['workspace_id']:
+        tasks = tasks.filter(workspace_id=filters['workspace_id'])
+    if filters['team_id']:
+        tasks = tasks.filter(team_id=filters['team_id'])
+    if filters['mine']:
+        tasks = tasks.filter(assignees__user_id=request.user_ctx['user'].id)
+    return tasks
+
+
+def _attach_client_names(tasks):
+    client_map = {c.id: c.name for c in Client.objects.filter(id__in={t.client_id for t in tasks}).only('id', 'name')}
     for t in tasks:
         t.client_name = client_map.get(t.client_id, '—')
 
-    tasks_by_stage = {}
-    for s in stages:
-        tasks_by_stage[s.id] = [t for t in tasks if t.stage_id == s.id]
 
-    _ensure_due_notifications(tasks)
+def _card_cursor(task):
+    return f'{task.position}:{task.id}'
+
+
+def tasks_dashboard(request):
+    guard = require_login(request)
+    if guard: return guard
+
+    filters = _task_filters(request)
+    tasks = _filtered_tasks(request, filters)
+
+    stages = active_stages()
+    stage_cards, total = _stage_counts(tasks, stages)
+
+    # Só as primeiras KANBAN_PAGE_SIZE tarefas de cada coluna; o restante vem de task_stage_cards.
+    first_cards = list(
+        tasks.annotate(column_rank=models.Window(
+            RowNumber(),
+            partition_by=[models.F('stage_id')],
+            order_by=[models.F('position').asc(), models.F('id').asc()],
+        )).filter(column_rank__lte=KANBAN_PAGE_SIZE).order_by('stage_id', 'position', 'id')
+    )
+    _attach_client_names(first_cards)
+
+    by_stage = {}
+    for t in first_cards:
+        by_stage.setdefault(t.stage_id, []).append(t)
+    counts = {c['id']: c['count'] for c in stage_cards}
+    columns = []
+    for s in stages:
+        cards = by_stage.get(s.id, [])
+        columns.append({
+            'stage': s,
+            'tasks': cards,
+            'has_more': counts[s.id] > len(cards),
+            'cursor': _card_cursor(cards[-1]) if cards else '',
+        })
 
     workspaces = Workspace.objects.filter(active=True).order_by('name')
     teams = Team.objects.filter(active=True).select_related('workspace').order_by('workspace__name', 'name')
+    allowed_team_ids = get_permissions(request).allowed_team_ids()
     if allowed_team_ids is not None:
         teams = teams.filter(id__in=allowed_team_ids)
 
     return render(request, 'tasks_dashboard.html', {
-        'tasks': tasks,
+        'columns': columns,
         'stages': stages,
         'stage_cards': stage_cards,
-        'tasks_by_stage': tasks_by_stage,
         'workspaces': workspaces,
         'teams': teams,
-        'q': q,
-        'stage_id': stage_id,
-        'priority': priority,
-        'workspace_id': workspace_id,
-        'team_id': team_id,
-        'total': tasks.count(),
+        'q': filters['q'],
+        'stage_id': filters['stage_id'],
+        'priority': filters['priority'],
+        'workspace_id': filters['workspace_id'],
+        'team_id': filters['team_id'],
+        'mine': filters['mine'],
+        'total': total,
+    })
+
+
+def task_stage_cards(request, stage_id):
+    """Próxima página de cartões de uma coluna do kanban (keyset em position, id)."""
+    guard = require_login(request)
+    if guard:
+        return JsonResponse({'error': 'unauthorized'}, status=401)
+
+    tasks = _filtered_tasks(request, _task_filters(request)).filter(stage_id=stage_id)
+
+    after = (request.GET.get('after') or '').strip()
+    if after:
+        try:
+            after_pos, after_id = (int(v) for v in after.split(':', 1))
+        except ValueError:
+            return JsonResponse({'error': 'cursor inválido'}, status=400)
+        tasks = tasks.filter(models.Q(position__gt=after_pos) | models.Q(position=after_pos, id__gt=after_id))
+
+    page = list(tasks.order_by('position', 'id')[:KANBAN_PAGE_SIZE + 1])
+    has_more = len(page) > KANBAN_PAGE_SIZE
+    page = page[:KANBAN_PAGE_SIZE]
+    _attach_client_names(page)
+
+    html = render_to_string('task_cards.html', {
+        'tasks': page,
+        'stages': active_stages(),
+    }, request=request)
+    return JsonResponse({
+        'html': html,
+        'count': len(page),
+        'has_more': has_more,
+        'next_cursor': _card_cursor(page[-1]) if page else None,
     })
 
 
+def task_search(request):
+    guard = require_login(request)
+    if guard:
+        return JsonResponse({'error': 'unauthorized'}, status=401)
+
+    q = (request.GET.get('q') or '').strip()
+    if not q:
+        return JsonResponse({'count': 0, 'results': []})
+    try:
+        limit = max(1, min(int(request.GET.get('limit') or 20), 100))
+    except ValueError:
+        limit = 20
+
+    docs = search_tasks(q, allowed_team_ids=get_permissions(request).allowed_team_ids(), limit=limit)
+    results = [{
+        'id': d.task_id,
+        'title': d.task.title,
+        'client_name': d.client_name,
+        'stage': stage_name(d.task.stage_id),
+        'team_id': d.task.team_id,
+        'priority': d.task.priority,
+        'due_date': d.task.due_date,
+        'rank': round(d.rank or 0, 4),
+        'similarity': round(d.similarity or 0, 4),
+        'url': f'/tasks/{d.task_id}/',
+    } for d in docs]
+    return JsonResponse({'count': len(results), 'results': results})
+
+
 @require_http_methods(["GET", "POST"])
 def tasks_settings(request):
     guard = require_login(request)
@@ -609,8 +771,18 @@ def tasks_settings(request):
         if action == 'add_stage':
             name = (request.POST.get('name') or '').strip()
             sort_order = int(request.POST.get('sort_order') or '0')
+            category = (request.POST.get('category') or '').strip()
+            if category not in dict(TaskStage.CATEGORY_CHOICES):
+                category = TaskStage.guess_category(name)
             if name:
-                TaskStage.objects.create(name=name, sort_order=sort_order)
+                TaskStage.objects.create(name=name, sort_order=sort_order, category=category)
+                invalidate_stages()
+        elif action == 'set_stage_category':
+            sid = (request.POST.get('stage_id') or '').strip()
+            category = (request.POST.get('category') or '').strip()
+            if category in dict(TaskStage.CATEGORY_CHOICES):
+                TaskStage.objects.filter(id=sid).update(category=category)
+                invalidate_stages()
         elif action == 'add_automation':
             name = (request.POST.get('name') or '').strip()
             from_stage = (request.POST.get('trigger_from_stage_id') or '').strip()
@@ -630,12 +802,14 @@ def tasks_settings(request):
                     team_id=(team_id or None),
                     active=True,
                 )
+                invalidate_automations()
         elif action == 'toggle_automation':
             aid = (request.POST.get('automation_id') or '').strip()
             a = TaskAutomation.objects.filter(id=aid).first()
             if a:
                 a.active = not a.active
                 a.save(update_fields=['active'])
+                invalidate_automations()
         elif action == 'add_recurrence':
             name = (request.POST.get('name') or '').strip()
             source_task_id = (request.POST.get('source_task_id') or '').strip()
@@ -650,22 +824,27 @@ def tasks_settings(request):
                     interval=max(interval, 1),
                     active=True,
                     last_run_at=None,
-                    next_run_at=_next_run(now, frequency, max(interval, 1)),
+                    next_run_at=next_run(now, frequency, max(interval, 1)),
                     created_at=now,
                 )
+                rules_changed()
         elif action == 'toggle_recurrence':
             rid = (request.POST.get('rule_id') or '').strip()
             r = TaskRecurrenceRule.objects.filter(id=rid).first()
             if r:
                 r.active = not r.active
-                r.save(update_fields=['active'])
+                if r.active and r.next_run_at < timezone.now():
+                    r.next_run_at = timezone.now()
+                r.save(update_fields=['active', 'next_run_at'])
+                rules_changed()
         elif action == 'run_recurrence_now':
-            _execute_due_recurrences(actor_email=user.email)
+            run_due_recurrences(actor=user.email)
 
         return redirect('/tasks/settings/')
 
     return render(request, 'tasks_settings.html', {
-        'stages': TaskStage.objects.all().order_by('sort_order', 'name'),
+        'stages': all_stages(),
+        'stage_categories': TaskStage.CATEGORY_CHOICES,
         'workspaces': Workspace.objects.filter(active=True).order_by('name'),
         'teams': Team.objects.filter(active=True).select_related('workspace').order_by('workspace__name', 'name'),
         'automations': TaskAutomation.objects.select_related('workspace', 'team', 'trigger_from_stage', 'trigger_to_stage').all().order_by('-created_at'),
@@ -706,7 +885,10 @@ def teams_settings(request):
             ws_id = (request.POST.get('workspace_id') or '').strip()
             ws = Workspace.objects.filter(id=ws_id).first()
             if ws:
+                affected = list(TeamMember.objects.filter(team__workspace=ws).values_list('user_id', flat=True))
                 ws.delete()
+                invalidate_memberships(affected)
+                invalidate_automations()
 
         elif action == 'add_team':
             ws_id = (request.POST.get('workspace_id') or '').strip()
@@ -731,7 +913,10 @@ def teams_settings(request):
             team_id = (request.POST.get('team_id') or '').strip()
             t = Team.objects.filter(id=team_id).first()
             if t:
+                affected = list(t.members.values_list('user_id', flat=True))
                 t.delete()
+                invalidate_memberships(affected)
+                invalidate_automations()
 
         elif action == 'add_member':
             team_id = (request.POST.get('team_id') or '').strip()
@@ -739,11 +924,14 @@ def teams_settings(request):
             role = (request.POST.get('role') or 'colaborador').strip()
             if team_id and user_id:
                 TeamMember.objects.get_or_create(team_id=team_id, user_id=user_id, defaults={'role': role})
+                invalidate_memberships([user_id])
 
         elif action == 'remove_member':
             member_id = (request.POST.get('member_id') or '').strip()
             if member_id:
+                affected = list(TeamMember.objects.filter(id=member_id).values_list('user_id', flat=True))
                 TeamMember.objects.filter(id=member_id).delete()
+                invalidate_memberships(affected)
 
         return redirect('/teams/settings/')
 
@@ -763,6 +951,9 @@ def task_stage_delete(request, stage_id):
     guard = require_login(request)
     if guard: return guard
     TaskStage.objects.filter(id=stage_id).delete()
+    invalidate_stages()
+    # Gatilhos que apontavam para o estágio viram NULL (= qualquer estágio).
+    invalidate_automations()
     return redirect('/tasks/settings/')
 
 
@@ -780,9 +971,10 @@ def task_new(request):
     if guard: return guard
 
     user = request.user_ctx['user']
-    allowed_team_ids = _allowed_team_ids(user)
+    perms = get_permissions(request)
+    allowed_team_ids = perms.allowed_team_ids()
 
-    stages = TaskStage.objects.filter(active=True).order_by('sort_order', 'name')
+    stages = active_stages()
     clients = Client.objects.all().order_by('name')
     workspaces = Workspace.objects.filter(active=True).order_by('name')
     teams = Team.objects.filter(active=True).select_related('workspace').order_by('workspace__name', 'name')
@@ -816,7 +1008,7 @@ def task_new(request):
         return HttpResponse('Sem permissão para essa equipe', status=403)
 
     if not user.is_admin and selected_team_id:
-        role = _team_role(user, int(selected_team_id))
+        role = perms.team_role(int(selected_team_id))
         if role not in ('gerente', 'admin_workspace'):
             return HttpResponse('Sem permissão para criar tarefa nesta equipe', status=403)
 
@@ -840,6 +1032,9 @@ def task_new(request):
         position=next_pos,
     )
 
+    if task.assigned_to:
+        sync_task_assignees(task)
+
     files = request.FILES.getlist('attachments')
     for f in files:
         TaskAttachment.objects.create(
@@ -849,7 +1044,8 @@ def task_new(request):
             created_at=timezone.now(),
         )
 
-    _notify(task, 'created', f"Nova tarefa criada: {task.title}")
+    refresh_task_search([task.id])
+    notify(task, 'created', f"Nova tarefa criada: {task.title}")
 
     return redirect(f'/tasks/{task.id}/')
 
@@ -864,30 +1060,36 @@ def task_move(request, task_id):
         return HttpResponse('Not found', status=404)
 
     user = request.user_ctx['user']
-    allowed_team_ids = _allowed_team_ids(user)
-    if allowed_team_ids is not None and (task.team_id not in allowed_team_ids):
+    perms = get_permissions(request)
+    if not perms.can_see_team(task.team_id):
         return HttpResponse('Sem permissão', status=403)
-    if not _can_manage_task(user, task):
+    if not perms.can_manage_task(task):
         return HttpResponse('Sem permissão para mover tarefa', status=403)
 
     stage_id = (request.POST.get('stage_id') or '').strip()
     if not stage_id:
         return HttpResponse('stage_id obrigatório', status=400)
 
-    stage = TaskStage.objects.filter(id=stage_id, active=True).first()
-    if not stage:
+    stage = get_stage(stage_id)
+    if not stage or not stage.active:
         return HttpResponse('stage inválido', status=400)
 
-    old_stage_id = task.stage_id
-    old_stage_name = TaskStage.objects.filter(id=old_stage_id).values_list('name', flat=True).first() or '—'
-    task.stage = stage
-    task.updated_at = timezone.now()
-    task.save(update_fields=['stage', 'updated_at'])
-    _run_stage_automations(task, old_stage_id, task.stage_id, actor_email=user.email)
-    _notify(task, 'stage_changed', f"Tarefa '{task.title}' movida de {old_stage_name} para {stage.name}")
+    _change_stage(task, stage, user)
     return HttpResponse('ok', status=200)
 
 
+def _change_stage(task, stage, user):
+    """Move a tarefa e grava automações + notificação numa única transação."""
+    old_stage_id = task.stage_id
+    old_stage_name = stage_name(task.stage_id)
+    with buffered_writes() as writes:
+        task.stage = stage
+        task.updated_at = timezone.now()
+        task.save(update_fields=['stage', 'updated_at'])
+        _run_stage_automations(task, old_stage_id, stage.id, writes, actor_email=user.email)
+        writes.notify(task, 'stage_changed', f"Tarefa '{task.title}' movida de {old_stage_name} para {stage.name}")
+
+
 @require_http_methods(["POST"])
 def task_reorder(request, task_id):
     guard = require_login(request)
@@ -897,11 +1099,10 @@ def task_reorder(request, task_id):
     if not task:
         return HttpResponse('Not found', status=404)
 
-    user = request.user_ctx['user']
-    allowed_team_ids = _allowed_team_ids(user)
-    if allowed_team_ids is not None and (task.team_id not in allowed_team_ids):
+    perms = get_permissions(request)
+    if not perms.can_see_team(task.team_id):
         return HttpResponse('Sem permissão', status=403)
-    if not _can_manage_task(user, task):
+    if not perms.can_manage_task(task):
         return HttpResponse('Sem permissão para reordenar tarefa', status=403)
 
     direction = (request.POST.get('direction') or '').strip()
@@ -973,8 +1174,8 @@ def task_detail(request, task_id):
         return HttpResponse('Not found', status=404)
 
     user = request.user_ctx['user']
-    allowed_team_ids = _allowed_team_ids(user)
-    if allowed_team_ids is not None and (task.team_id not in allowed_team_ids):
+    perms = get_permissions(request)
+    if not perms.can_see_team(task.team_id):
         return HttpResponse('Sem permissão', status=403)
 
     task.client_obj = Client.objects.filter(id=task.client_id).first()
@@ -983,32 +1184,25 @@ def task_detail(request, task_id):
         action = request.POST.get('action')
 
         if action == 'comment':
-            if not _can_interact_task(user, task):
+            if not perms.can_interact_task(task):
                 return HttpResponse('Sem permissão para comentar', status=403)
             txt = (request.POST.get('comment') or '').strip()
             if txt:
-                TaskComment.objects.create(
-                    task=task,
-                    comment=txt,
-                    author=(user.email if getattr(request, 'user_ctx', None) else None),
-                    created_at=timezone.now(),
-                )
-                _notify(task, 'comment', f"Novo comentário em '{task.title}' por {user.name or user.email}")
+                with buffered_writes() as writes:
+                    writes.comment(task, txt, author=(user.email if getattr(request, 'user_ctx', None) else None))
+                    writes.notify(task, 'comment', f"Novo comentário em '{task.title}' por {user.name or user.email}")
+                refresh_task_search([task.id])
         elif action == 'stage':
-            if not _can_manage_task(user, task):
+            if not perms.can_manage_task(task):
                 return HttpResponse('Sem permissão para mover estágio', status=403)
             sid = (request.POST.get('stage_id') or '').strip()
             if sid:
-                old_stage_id = task.stage_id
-                old_stage_name = TaskStage.objects.filter(id=old_stage_id).values_list('name', flat=True).first() or '—'
-                task.stage_id = sid
-                task.updated_at = timezone.now()
-                task.save(update_fields=['stage', 'updated_at'])
-                _run_stage_automations(task, old_stage_id, task.stage_id, actor_email=user.email)
-                new_stage_name = TaskStage.objects.filter(id=task.stage_id).values_list('name', flat=True).first() or '—'
-                _notify(task, 'stage_changed', f"Tarefa '{task.title}' movida de {old_stage_name} para {new_stage_name}")
+                stage = get_stage(sid)
+                if not stage:
+                    return HttpResponse('stage inválido', status=400)
+                _change_stage(task, stage, user)
         elif action == 'attach':
-            if not _can_interact_task(user, task):
+            if not perms.can_interact_task(task):
                 return HttpResponse('Sem permissão para anexar', status=403)
             files = request.FILES.getlist('attachments')
             for f in files:
@@ -1024,5 +1218,5 @@ def task_detail(request, task_id):
         'task': task,
         'comments': task.comments.all().order_by('created_at'),
         'attachments': task.attachments.all().order_by('-created_at'),
-        'stages': TaskStage.objects.filter(active=True).order_by('sort_order', 'name'),
+        'stages': active_stages(),
     })
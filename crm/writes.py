@@ -0,0 +1,60 @@
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AutomationOutbox, TaskComment, TaskNotification
+from .notifications import create_notifications
+
+
+class WriteBuffer:
+    """Acumula comentários, notificações e automações de uma requisição para gravar em lote."""
+
+    def __init__(self):
+        self.comments = []
+        self.notifications = []
+        self.automations = []
+
+    def comment(self, task, text, author=None):
+        self.comments.append(TaskComment(task=task, comment=text, author=author, created_at=timezone.now()))
+
+    def notify(self, task, event_type, message):
+        self.notifications.append(TaskNotification(
+            task=task,
+            team_id=task.team_id,
+            event_type=event_type,
+            message=message,
+            created_at=timezone.now(),
+            read=False,
+        ))
+
+    def enqueue_automation(self, task, rule, old_stage_id, new_stage_id, actor=None):
+        self.automations.append(AutomationOutbox(
+            task=task,
+            automation_id=rule.id,
+            old_stage_id=old_stage_id,
+            new_stage_id=new_stage_id,
+            actor=actor,
+            created_at=timezone.now(),
+            available_at=timezone.now(),
+        ))
+
+    def flush(self):
+        if self.comments:
+            TaskComment.objects.bulk_create(self.comments)
+            self.comments = []
+        if self.notifications:
+            create_notifications(self.notifications)
+            self.notifications = []
+        if self.automations:
+            AutomationOutbox.objects.bulk_create(self.automations)
+            self.automations = []
+
+
+@contextmanager
+def buffered_writes():
+    """Abre uma transação e grava o buffer no fim dela: ou tudo é gravado, ou nada."""
+    buffer = WriteBuffer()
+    with transaction.atomic():
+        yield buffer
+        buffer.flush()